@@ -0,0 +1,144 @@
+import json
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request, stream_with_context
+
+import queries
+import search
+import summaries
+from models import Artist, Venue
+from caching import cache, artist_key, venue_key
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+VENUE_FIELDS = ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+  'facebook_link', 'image_link', 'seeking_talent', 'seeking_description',
+  'upcoming_shows_count', 'past_shows_count')
+ARTIST_FIELDS = ('id', 'name', 'city', 'state', 'phone', 'genres', 'website',
+  'facebook_link', 'image_link', 'seeking_venue', 'seeking_description',
+  'upcoming_shows_count', 'past_shows_count')
+SHOW_FIELDS = ('venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link', 'start_time')
+
+def _fields(allowed, default):
+  # ?fields=id,name -> ('id', 'name'); unknown names are a client error
+  raw = request.args.get('fields')
+  if not raw:
+    return default
+  fields = tuple(field.strip() for field in raw.split(',') if field.strip())
+  unknown = [field for field in fields if field not in allowed]
+  if unknown:
+    abort(400, 'unknown fields: ' + ', '.join(unknown))
+  return fields
+
+# values that are timestamps, whatever form they reach the API in
+TIME_FIELDS = ('start_time',)
+
+def _timestamp(value):
+  # the API's one wire format for times: ISO 8601 in UTC with its offset.
+  # Pages cached in redis hold ISO strings, the local cache and the
+  # database hold datetimes; both end up the same here.
+  if isinstance(value, str):
+    import dateutil.parser
+    value = dateutil.parser.isoparse(value)
+  if value.tzinfo is None:
+    # naive values are in the database session's time zone
+    value = value.astimezone()
+  return value.astimezone(timezone.utc).isoformat()
+
+def _plain(value, key=None):
+  # timestamps in TIME_FIELDS, including the ones nested in show lists
+  if isinstance(value, datetime) or (key in TIME_FIELDS and isinstance(value, str)):
+    return _timestamp(value)
+  if isinstance(value, list):
+    return [_plain(item) for item in value]
+  if isinstance(value, dict):
+    return {name: _plain(item, name) for name, item in value.items()}
+  return value
+
+def _select(item, fields):
+  return {field: _plain(item[field], field) for field in fields if field in item}
+
+def _limit():
+  return max(1, min(request.args.get('limit', 100, type=int), current_app.config['API_MAX_PAGE_SIZE']))
+
+def _stream(items, next_cursor):
+  # writes {"data": [...], "next_cursor": ...} one item at a time so large
+  # pages never have to be held as a single string; next_cursor is a
+  # callable because it is only known once the items are exhausted
+  def generate():
+    yield '{"data": ['
+    for position, item in enumerate(items):
+      yield (',' if position else '') + json.dumps(item)
+    yield '], "next_cursor": ' + json.dumps(next_cursor()) + '}'
+  return Response(stream_with_context(generate()), mimetype='application/json')
+
+def _entity_list(model, allowed):
+  fields = _fields(allowed, ('id', 'name', 'city', 'state'))
+  limit = _limit()
+  after_id = request.args.get('cursor', type=int)
+  rows = queries.entity_page(model, fields, after_id=after_id, limit=limit)
+  state = {"last_id": None, "more": False}
+
+  def items():
+    for position, row in enumerate(rows):
+      if position == limit:
+        state["more"] = True
+        break
+      state["last_id"] = row.id
+      yield _select(row._asdict(), fields)
+
+  return _stream(items(), lambda: state["last_id"] if state["more"] else None)
+
+@api.route('/venues')
+def venues():
+  return _entity_list(Venue, VENUE_FIELDS)
+
+@api.route('/artists')
+def artists():
+  return _entity_list(Artist, ARTIST_FIELDS)
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+  venue_data = cache.get_or_set(venue_key(venue_id), lambda: summaries.venue_page(venue_id))
+  if venue_data is None:
+    abort(404)
+  fields = _fields(tuple(venue_data), tuple(venue_data))
+  return jsonify(_select(venue_data, fields))
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+  artist_data = cache.get_or_set(artist_key(artist_id), lambda: summaries.artist_page(artist_id))
+  if artist_data is None:
+    abort(404)
+  fields = _fields(tuple(artist_data), tuple(artist_data))
+  return jsonify(_select(artist_data, fields))
+
+@api.route('/shows')
+def shows():
+  fields = _fields(SHOW_FIELDS, SHOW_FIELDS)
+  show_data, next_cursor = queries.show_feed(cursor=request.args.get('cursor'), limit=_limit())
+  return _stream((_select(show, fields) for show in show_data), lambda: next_cursor)
+
+@api.route('/search')
+def search_entities():
+  term = request.args.get('q', '')
+  scope = request.args.get('scope', 'all')
+  limit = _limit()
+  if request.args.get('type', 'venue') == 'artist':
+    results = search.search_artists(term, scope=scope, limit=limit)
+  else:
+    results = search.search_venues(term, scope=scope, limit=limit)
+  return jsonify(results)
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def api_error(error):
+  return jsonify({"error": error.code, "message": error.description}), error.code
+
+def init_app(app):
+  app.config.setdefault('API_MAX_PAGE_SIZE', 1000)
+  app.register_blueprint(api)
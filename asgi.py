@@ -0,0 +1,346 @@
+import json
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+
+import asyncpg
+from flask import current_app, g, jsonify, render_template, request, session, Response as FlaskResponse
+from sqlalchemy.dialects import postgresql
+from starlette.applications import Starlette
+from starlette.middleware.wsgi import WSGIMiddleware, build_environ
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+
+import api
+import instrumentation
+import queries
+import search
+import summaries
+import views
+from app import create_app
+from models import Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Async read mode.
+#----------------------------------------------------------------------------#
+
+# An ASGI entry point for I/O-bound deployments: uvicorn asgi:app. The
+# read-only routes (listings, detail pages, search, the JSON API) wait on
+# Postgres through an asyncpg pool on the event loop, so a worker serves
+# many of them at once instead of one per thread. Everything else, and any
+# request a read view hands back, goes to the unchanged Flask app through
+# WSGIMiddleware.
+#
+# Read views are generators written like the Flask views: each yield is a
+# tuple of SQLAlchemy queries, built by the same functions the WSGI views
+# use, and the yield evaluates to their rows. Queries are compiled for
+# asyncpg and awaited between two Flask request contexts; nothing is
+# awaited while a context is pushed, so contexts never interleave on the
+# loop. Templates, url_for, the after_request hooks (Server-Timing, access
+# log, metrics) run exactly as under WSGI.
+#
+# Not on the async path: the view-model cache and conditional GET (their
+# backends block), and the read replica routing of replicas.py; point
+# ASYNC_DATABASE_URI at a replica to read from one.
+
+class Delegate(Exception):
+  # raised by a read view to have the Flask app answer the request instead
+  pass
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+DIALECT = postgresql.dialect(paramstyle='numeric')
+PLACEHOLDER = re.compile(r'(?<![:\w]):(\d+)')
+
+def _param(value):
+  # give naive datetimes (?from=&to=) the worker's time zone explicitly
+  if isinstance(value, datetime) and value.tzinfo is None:
+    return value.astimezone()
+  return value
+
+def compile_query(query):
+  # (sql with $n placeholders, positional parameters) for a Query or select
+  statement = getattr(query, 'statement', query)
+  compiled = statement.compile(dialect=DIALECT)
+  params = compiled.construct_params()
+  return PLACEHOLDER.sub(r'$\1', compiled.string), [_param(params[name]) for name in compiled.positiontup]
+
+@lru_cache(maxsize=256)
+def _row_type(keys):
+  return namedtuple('Row', keys, rename=True)
+
+def _row(record):
+  # asyncpg records as the named tuples the row-shaping functions expect
+  return _row_type(tuple(record.keys()))(*record.values())
+
+async def _init_connection(connection):
+  await connection.set_type_codec('jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+def database_uri(config):
+  # asyncpg takes the libpq form of the URL, without a +driver suffix
+  uri = config['ASYNC_DATABASE_URI'] or config['SQLALCHEMY_DATABASE_URI']
+  scheme, rest = uri.split('://', 1)
+  return scheme.split('+', 1)[0] + '://' + rest
+
+class Database(object):
+
+  def __init__(self):
+    self.pool = None
+    self.timeout = None
+
+  async def start(self, config):
+    server_settings = {"application_name": "fyyur-asgi"}
+    if config['DB_STATEMENT_TIMEOUT_MS']:
+      server_settings['statement_timeout'] = str(config['DB_STATEMENT_TIMEOUT_MS'])
+    self.timeout = config['DB_POOL_TIMEOUT']
+    self.pool = await asyncpg.create_pool(database_uri(config),
+      min_size=config['ASYNC_POOL_MIN_SIZE'], max_size=config['ASYNC_POOL_MAX_SIZE'],
+      # PgBouncer in transaction mode cannot keep prepared statements
+      statement_cache_size=0 if config['DB_PGBOUNCER'] else 100,
+      server_settings=server_settings, init=_init_connection)
+
+  async def stop(self):
+    await self.pool.close()
+
+  async def fetch(self, statements, stats):
+    # rows for each (sql, params), in order, on one connection
+    results = []
+    async with self.pool.acquire(timeout=self.timeout) as connection:
+      for sql, params in statements:
+        started = time.perf_counter()
+        records = await connection.fetch(sql, *params)
+        stats.statement(time.perf_counter() - started, sql)
+        results.append([_row(record) for record in records])
+    return results
+
+database = Database()
+
+#----------------------------------------------------------------------------#
+# Driver.
+#----------------------------------------------------------------------------#
+
+async def _read_body(receive):
+  body, more = b'', True
+  while more:
+    message = await receive()
+    body += message.get('body', b'')
+    more = message.get('more_body', False)
+  return body
+
+def _replay(body):
+  # a receive channel for the Flask app once the body has been read here
+  async def receive():
+    return {"type": "http.request", "body": body, "more_body": False}
+  return receive
+
+def _starlette_response(response):
+  converted = Response(response.get_data(), status_code=response.status_code)
+  converted.raw_headers = [(key.lower().encode('latin-1'), value.encode('latin-1'))
+    for key, value in response.headers]
+  return converted
+
+class ReadView(object):
+  # ASGI endpoint driving one generator view
+
+  def __init__(self, app, wsgi, view):
+    self.app = app
+    self.wsgi = wsgi
+    self.view = view
+
+  async def __call__(self, scope, receive, send):
+    body = await _read_body(receive) if scope['method'] == 'POST' else b''
+    response = await self.respond(scope, body)
+    if response is None:
+      await self.wsgi(scope, _replay(body), send)
+    else:
+      await response(scope, receive, send)
+
+  async def respond(self, scope, body):
+    # a starlette response, or None to hand the request to the Flask app
+    stats = instrumentation.RequestStats(keep=self.app.config['SLOW_REQUEST_STATEMENTS'])
+    view = self.view(**scope.get('path_params', {}))
+    rows = None
+    try:
+      while True:
+        with self.app.request_context(build_environ(scope, body)):
+          if session.get('_flashes'):
+            # only the Flask app consumes flashed messages and saves the session
+            return None
+          g.request_stats = stats
+          try:
+            pending = view.send(rows)
+          except StopIteration as stop:
+            response = self.app.process_response(self.app.make_response(stop.value))
+            return _starlette_response(response)
+          statements = [compile_query(query) for query in pending]
+        rows = await database.fetch(statements, stats)
+    except (Delegate, HTTPException):
+      return None
+
+ROUTES = []
+
+def read(path, methods=('GET',)):
+  # registers a generator view for the async path
+  def decorator(view):
+    ROUTES.append((path, methods, view))
+    return view
+  return decorator
+
+#----------------------------------------------------------------------------#
+# Pages.
+#----------------------------------------------------------------------------#
+
+@read('/venues')
+def venues():
+  genres = request.args.getlist('genre')
+  match = request.args.get('match', 'all')
+  areas, facets = yield (queries.venue_areas_query(genres, match),
+    queries.genre_facets_query(Venue, genres, match))
+
+  return render_template('pages/venues.html', areas=queries.areas_from_rows(areas),
+    facets=queries.facets_from_rows(facets), genres=genres)
+
+@read('/venues/search', methods=('POST',))
+def search_venues():
+  search_term = request.form.get('search_term', '')
+  rows, = yield (search.search_query(Venue, search_term, request.form.get('search_scope', 'all'),
+    current_app.config['SEARCH_RESULTS_LIMIT']),)
+
+  return render_template('pages/search_venues.html', results=search.results_from_rows(rows),
+    search_term=search_term)
+
+@read('/venues/{venue_id:int}')
+def show_venue(venue_id):
+  rows, = yield (summaries.page_query('venue', venue_id),)
+  if not rows:
+    # not summarized yet (or missing): the Flask view falls back or 404s
+    raise Delegate()
+
+  return render_template('pages/show_venue.html', venue=summaries.page_from_row(rows[0]))
+
+@read('/artists')
+def artists():
+  genres = request.args.getlist('genre')
+  match = request.args.get('match', 'all')
+  artist_rows, facets = yield (queries.artist_list_query(genres, match),
+    queries.genre_facets_query(Artist, genres, match))
+
+  return render_template('pages/artists.html', artists=queries.artists_from_rows(artist_rows),
+    facets=queries.facets_from_rows(facets), genres=genres)
+
+@read('/artists/search', methods=('POST',))
+def search_artists():
+  search_term = request.form.get('search_term', '')
+  rows, = yield (search.search_query(Artist, search_term, request.form.get('search_scope', 'all'),
+    current_app.config['SEARCH_RESULTS_LIMIT']),)
+
+  return render_template('pages/search_artists.html', results=search.results_from_rows(rows),
+    search_term=search_term)
+
+@read('/artists/{artist_id:int}')
+def show_artist(artist_id):
+  rows, = yield (summaries.page_query('artist', artist_id),)
+  if not rows:
+    raise Delegate()
+
+  return render_template('pages/show_artist.html', artist=summaries.page_from_row(rows[0]))
+
+@read('/shows')
+def shows():
+  cursor = request.args.get('cursor')
+  start, end = views._time_window()
+  city = request.args.get('city')
+  filters = {key: request.args[key] for key in ('from', 'to', 'city') if request.args.get(key)}
+  limit = current_app.config['SHOWS_PER_PAGE']
+  rows, = yield (queries.show_feed_query(cursor, start=start, end=end, city=city).limit(limit + 1),)
+
+  show_data, next_cursor = queries.feed_from_rows(rows, limit)
+  return render_template('pages/shows.html', shows=show_data, next_cursor=next_cursor, filters=filters)
+
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+def _json_page(items, next_cursor):
+  # the {"data": [...], "next_cursor": ...} document api._stream writes
+  return FlaskResponse('{"data": [' + ','.join(json.dumps(item) for item in items) +
+    '], "next_cursor": ' + json.dumps(next_cursor) + '}', mimetype='application/json')
+
+def _entity_list(model, allowed):
+  fields = api._fields(allowed, ('id', 'name', 'city', 'state'))
+  limit = api._limit()
+  rows, = yield (queries.entity_page(model, fields, after_id=request.args.get('cursor', type=int),
+    limit=limit),)
+
+  page = rows[:limit]
+  return _json_page([api._select(row._asdict(), fields) for row in page],
+    page[-1].id if len(rows) > limit else None)
+
+def _entity(kind, id):
+  rows, = yield (summaries.page_query(kind, id),)
+  if not rows:
+    raise Delegate()
+  data = summaries.page_from_row(rows[0])
+  fields = api._fields(tuple(data), tuple(data))
+  return jsonify(api._select(data, fields))
+
+@read('/api/v1/venues')
+def api_venues():
+  return (yield from _entity_list(Venue, api.VENUE_FIELDS))
+
+@read('/api/v1/artists')
+def api_artists():
+  return (yield from _entity_list(Artist, api.ARTIST_FIELDS))
+
+@read('/api/v1/venues/{venue_id:int}')
+def api_venue(venue_id):
+  return (yield from _entity('venue', venue_id))
+
+@read('/api/v1/artists/{artist_id:int}')
+def api_artist(artist_id):
+  return (yield from _entity('artist', artist_id))
+
+@read('/api/v1/shows')
+def api_shows():
+  fields = api._fields(api.SHOW_FIELDS, api.SHOW_FIELDS)
+  limit = api._limit()
+  rows, = yield (queries.show_feed_query(request.args.get('cursor')).limit(limit + 1),)
+
+  show_data, next_cursor = queries.feed_from_rows(rows, limit)
+  return _json_page([api._select(show, fields) for show in show_data], next_cursor)
+
+@read('/api/v1/search')
+def api_search():
+  model = Artist if request.args.get('type', 'venue') == 'artist' else Venue
+  rows, = yield (search.search_query(model, request.args.get('q', ''),
+    request.args.get('scope', 'all'), api._limit()),)
+
+  return jsonify(search.results_from_rows(rows))
+
+#----------------------------------------------------------------------------#
+# Application.
+#----------------------------------------------------------------------------#
+
+def create_asgi_app(config='config'):
+  flask_app = create_app(config)
+  flask_app.config.setdefault('ASYNC_DATABASE_URI', None)
+  flask_app.config.setdefault('ASYNC_POOL_MIN_SIZE', 2)
+  flask_app.config.setdefault('ASYNC_POOL_MAX_SIZE', 20)
+  wsgi = WSGIMiddleware(flask_app)
+
+  routes = [Route(path, ReadView(flask_app, wsgi, view), methods=list(methods))
+    for path, methods, view in ROUTES]
+  # everything without an async view, in its own threadpool
+  routes.append(Mount('/', app=wsgi))
+
+  async def start():
+    await database.start(flask_app.config)
+
+  return Starlette(routes=routes, on_startup=[start], on_shutdown=[database.stop])
+
+app = create_asgi_app()
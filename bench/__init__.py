@@ -0,0 +1,123 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+# flask bench generate --shows 100000   load a synthetic catalog
+# flask bench routes -o before.json     time every read route
+# flask bench startup -o startup.json   time worker cold start
+# flask bench load -o wsgi.json         drive a running server (see README)
+# flask bench compare before.json after.json
+#
+# Run against a scratch database: generate writes straight into the tables.
+
+bench_cli = AppGroup('bench', help='Benchmarks against a synthetic catalog.')
+
+def _catalog(app):
+  # (row counts, database version) recorded with the results
+  from models import db, Artist, Venue, Show
+
+  scale = {
+    "venues": db.session.query(db.func.count(Venue.id)).scalar(),
+    "artists": db.session.query(db.func.count(Artist.id)).scalar(),
+    "shows": db.session.query(db.func.count(Show.id)).scalar(),
+  }
+  engine = db.get_engine(app)
+  database = '{} {}'.format(engine.dialect.name, '.'.join(map(str, engine.dialect.server_version_info or ())))
+  db.session.remove()
+  return scale, database
+
+@bench_cli.command('generate')
+@click.option('--shows', default=10000, show_default=True, help='Number of shows (1k to 10M).')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--append', is_flag=True, help='Add to a database that already has data.')
+def generate_command(shows, seed, append):
+  """Fill Venue, Artist and Show with synthetic data."""
+  from bench import generate
+  from models import db, Venue
+
+  if db.session.query(Venue.id).first() is not None and not append:
+    raise click.UsageError('the database already has venues; use a scratch database or pass --append')
+  scale = generate.generate(shows, seed=seed, echo=click.echo)
+  click.echo('loaded {venues} venues, {artists} artists, {shows} shows'.format(**scale))
+
+@bench_cli.command('routes')
+@click.option('--iterations', default=50, show_default=True)
+@click.option('--warmup', default=5, show_default=True)
+@click.option('--cache/--no-cache', default=False, show_default=True,
+  help='Keep the view-model cache on (off measures the database path).')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the results JSON here.')
+def routes_command(iterations, warmup, cache, output):
+  """Measure p50/p99 latency and statement counts for every read route."""
+  from bench import results, routes
+  from caching import LocalBackend, cache as view_cache
+
+  app = current_app._get_current_object()
+  app.config['SERVER_TIMING'] = True
+  if not cache:
+    view_cache.backend = LocalBackend(max_entries=0)
+
+  scale, database = _catalog(app)
+  measured = routes.run(app, iterations=iterations, warmup=warmup, echo=click.echo)
+  document = results.document(measured, scale, database,
+    {"iterations": iterations, "warmup": warmup, "cache": cache}, routes.uncovered(app))
+  for rule in document['uncovered']:
+    click.echo('not covered: {}'.format(rule), err=True)
+  if output:
+    results.save(document, output)
+    click.echo('results written to {}'.format(output))
+
+@bench_cli.command('load')
+@click.option('--url', default='http://127.0.0.1:8000', show_default=True, help='Server under test.')
+@click.option('--concurrency', default=32, show_default=True, help='Clients per route.')
+@click.option('--duration', default=10.0, show_default=True, help='Seconds per route.')
+@click.option('--route', 'names', multiple=True, help='Only this route (by name); repeatable.')
+@click.option('--label', help='Recorded in the results, e.g. "uvicorn asgi:app -w 4".')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the results JSON here.')
+def load_command(url, concurrency, duration, names, label, output):
+  """Drive a running server with concurrent clients; report latency and throughput."""
+  from bench import load, results, routes
+
+  app = current_app._get_current_object()
+  scale, database = _catalog(app)
+  measured = load.run(url, routes.sample_values(app), concurrency=concurrency, duration=duration,
+    names=set(names), echo=click.echo)
+  settings = {"url": url, "concurrency": concurrency, "duration": duration, "label": label}
+  if output:
+    results.save(results.document(measured, scale, database, settings, []), output)
+    click.echo('results written to {}'.format(output))
+
+@bench_cli.command('startup')
+@click.option('--runs', default=10, show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Write the results JSON here.')
+def startup_command(runs, output):
+  """Time 'import app' and create_app() in fresh interpreters."""
+  from bench import results, startup
+
+  measured = startup.measure(runs)
+  for key in ('interpreter', 'import', 'create_app', 'total'):
+    click.echo('{:<12} p50 {:>8.1f}ms  max {:>8.1f}ms'.format(
+      key, measured[key]['p50_ms'], measured[key]['max_ms']))
+  click.echo('{} modules loaded'.format(measured['modules']))
+  if output:
+    results.save(results.document({}, None, None, {"runs": runs}, [], startup=measured), output)
+    click.echo('results written to {}'.format(output))
+
+@bench_cli.command('compare')
+@click.argument('before', type=click.Path(exists=True, dir_okay=False))
+@click.argument('after', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', default=1.25, show_default=True, help='Allowed slowdown factor.')
+@click.pass_context
+def compare_command(ctx, before, after, threshold):
+  """Fail if a route got slower or runs more statements than before."""
+  from bench import results
+
+  regressions = results.compare(results.load(before), results.load(after), threshold)
+  for name, key, old, new in regressions:
+    click.echo('{}: {} {} -> {}'.format(name, key, old, new), err=True)
+  if regressions:
+    ctx.exit(1)
+  click.echo('no regressions')
@@ -0,0 +1,173 @@
+import csv
+import io
+import random
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+
+import counters
+import geo
+import summaries
+from forms import VenueForm
+from models import db, Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Synthetic catalog.
+#----------------------------------------------------------------------------#
+
+# Fills Venue, Artist and Show at a given show count with shapes that look
+# like real traffic: venue and artist popularity follow a Zipf curve, cities
+# are weighted towards the large ones, and shows cluster on evenings and
+# weekends over the year before and after today. Shows are laid out in
+# three-hour slots with each venue and artist used at most once per slot,
+# so the booking exclusion constraints always hold.
+
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+ADJECTIVES = ('Blue', 'Golden', 'Velvet', 'Electric', 'Rusty', 'Silver', 'Crimson', 'Hidden',
+  'Lucky', 'Midnight', 'Neon', 'Old', 'Wild', 'Little', 'Grand', 'Broken')
+VENUE_NOUNS = ('Room', 'Hall', 'Lounge', 'Tavern', 'Cellar', 'Garage', 'Ballroom', 'Theatre',
+  'Club', 'Social', 'Parlor', 'Warehouse')
+ARTIST_NOUNS = ('Wolves', 'Echoes', 'Saints', 'Machines', 'Rivers', 'Ghosts', 'Kings', 'Owls',
+  'Satellites', 'Strangers', 'Lights', 'Hearts')
+
+DAYS_BEFORE = DAYS_AFTER = 365
+# (start hour, relative demand); a show lasts two hours and may start up to
+# half an hour late, so consecutive slots never overlap
+SLOTS = ((12, 0.5), (15, 1.0), (18, 3.0), (21, 2.5))
+WEEKEND = 1.6
+DURATION = timedelta(hours=2)
+
+def _zipf(count, exponent=1.1):
+  return list(accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+def scale_for(shows):
+  # entity counts for a show count, keeping a few dozen shows per venue
+  return {"venues": max(20, shows // 50), "artists": max(40, shows // 25), "shows": shows}
+
+def _genres(rng):
+  return rng.sample(GENRES, rng.choice((1, 1, 2, 2, 3)))
+
+def _array(values):
+  return '{' + ','.join('"{}"'.format(value) for value in values) + '}'
+
+def _venue(rng, id, place):
+  (city, state), (latitude, longitude) = place
+  name = 'The {} {}'.format(rng.choice(ADJECTIVES), rng.choice(VENUE_NOUNS))
+  return (id, name, city.title(), state, '{} Main Street'.format(rng.randint(1, 9999)),
+    '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)), _array(_genres(rng)),
+    'https://www.facebook.com/venue{}'.format(id), 'https://picsum.photos/seed/venue{}/400'.format(id),
+    'https://venue{}.example.com'.format(id), 't' if rng.random() < 0.4 else 'f',
+    latitude, longitude, geo.geohash_encode(latitude, longitude))
+
+VENUE_COLUMNS = ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'facebook_link',
+  'image_link', 'website', 'seeking_talent', 'latitude', 'longitude', 'geohash')
+
+def _artist(rng, id, place):
+  (city, state), _ = place
+  name = '{} {}'.format(rng.choice(ADJECTIVES), rng.choice(ARTIST_NOUNS))
+  return (id, name, city.title(), state,
+    '555-{:03d}-{:04d}'.format(rng.randint(0, 999), rng.randint(0, 9999)), _array(_genres(rng)),
+    'https://www.facebook.com/artist{}'.format(id), 'https://picsum.photos/seed/artist{}/400'.format(id),
+    'https://artist{}.example.com'.format(id), 't' if rng.random() < 0.3 else 'f')
+
+ARTIST_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'genres', 'facebook_link',
+  'image_link', 'website', 'seeking_venue')
+
+def _slots(today):
+  # (start of slot, demand) for every slot in the window
+  for day in range(-DAYS_BEFORE, DAYS_AFTER):
+    date = today + timedelta(days=day)
+    weight = WEEKEND if date.weekday() in (4, 5) else 1.0
+    for hour, demand in SLOTS:
+      yield datetime.combine(date, time(hour)).astimezone(), demand * weight
+
+def _shows(rng, count, venue_ids, artist_ids):
+  venue_weights, artist_weights = _zipf(len(venue_ids)), _zipf(len(artist_ids))
+  rng.shuffle(venue_ids)
+  rng.shuffle(artist_ids)
+  slots = list(_slots(datetime.now().date()))
+  total_demand = sum(demand for _, demand in slots)
+  per_slot_cap = min(len(venue_ids), len(artist_ids)) // 2
+
+  carry = 0.0
+  for start, demand in slots:
+    carry += count * demand / total_demand
+    # the epsilon keeps float error from dropping the final show
+    whole = int(carry + 1e-9)
+    wanted = min(whole, per_slot_cap)
+    carry -= whole
+    venues, artists = set(), set()
+    while len(venues) < wanted:
+      venues.update(rng.choices(venue_ids, cum_weights=venue_weights, k=wanted - len(venues)))
+    while len(artists) < wanted:
+      artists.update(rng.choices(artist_ids, cum_weights=artist_weights, k=wanted - len(artists)))
+    for venue_id, artist_id in zip(venues, artists):
+      start_time = start + timedelta(minutes=rng.choice((0, 0, 15, 30)))
+      yield (venue_id, artist_id, start_time.isoformat(), (start_time + DURATION).isoformat())
+
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time', 'end_time')
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+def _copy(model, columns, rows, chunk_size=50000):
+  # COPY ... FROM STDIN in chunks: far faster than INSERTs at this volume
+  cursor = db.session.connection().connection.cursor()
+  statement = 'COPY "{}" ({}) FROM STDIN WITH (FORMAT csv)'.format(
+    model.__tablename__, ', '.join(columns))
+  written, buffer = 0, io.StringIO()
+  writer = csv.writer(buffer)
+  for row in rows:
+    writer.writerow(row)
+    written += 1
+    if written % chunk_size == 0:
+      buffer.seek(0)
+      cursor.copy_expert(statement, buffer)
+      buffer.seek(0)
+      buffer.truncate()
+  buffer.seek(0)
+  cursor.copy_expert(statement, buffer)
+  return written
+
+def _next_id(model):
+  return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def _reset_sequence(model):
+  db.session.execute("SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+    "coalesce(max(id), 1)) FROM \"{0}\"".format(model.__tablename__))
+
+def generate(shows, seed=0, echo=print):
+  rng = random.Random(seed)
+  scale = scale_for(shows)
+  places = list(geo.places().items())
+  # the dataset lists larger cities first; they get more of everything
+  place_weights = _zipf(len(places), exponent=0.8)
+
+  first = _next_id(Venue)
+  venue_ids = list(range(first, first + scale['venues']))
+  _copy(Venue, VENUE_COLUMNS, (_venue(rng, id, place) for id, place in
+    zip(venue_ids, rng.choices(places, cum_weights=place_weights, k=len(venue_ids)))))
+  echo('{} venues'.format(len(venue_ids)))
+
+  first = _next_id(Artist)
+  artist_ids = list(range(first, first + scale['artists']))
+  _copy(Artist, ARTIST_COLUMNS, (_artist(rng, id, place) for id, place in
+    zip(artist_ids, rng.choices(places, cum_weights=place_weights, k=len(artist_ids)))))
+  echo('{} artists'.format(len(artist_ids)))
+
+  written = _copy(Show, SHOW_COLUMNS, _shows(rng, shows, venue_ids, artist_ids))
+  echo('{} shows'.format(written))
+
+  for model in (Venue, Artist, Show):
+    _reset_sequence(model)
+  db.session.commit()
+
+  # derived data the pages read, then fresh planner statistics
+  counters.reconcile(fix=True)
+  for kind in sorted(summaries.READ_MODELS):
+    summaries.refresh_all(kind)
+  for model in (Venue, Artist, Show):
+    db.session.execute('ANALYZE "{}"'.format(model.__tablename__))
+  db.session.commit()
+  echo('counters, summaries and statistics updated')
+  return {"venues": len(venue_ids), "artists": len(artist_ids), "shows": written}
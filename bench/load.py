@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import Counter
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlencode, urlsplit
+
+from bench.routes import ROUTES, _statements
+
+#----------------------------------------------------------------------------#
+# Load against a running server.
+#----------------------------------------------------------------------------#
+
+# 'flask bench routes' times one request at a time through the test client;
+# this drives a real server (gunicorn with WSGI workers, or uvicorn with
+# asgi:app) with CONCURRENCY keep-alive clients per route for a fixed time,
+# which is where the two deployment modes differ. The clients are threads,
+# so run the generator on cores the server does not use.
+
+def _connect(url):
+  parts = urlsplit(url)
+  connection = HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+  return connection(parts.netloc, timeout=30)
+
+def _client(url, method, path, data, deadline, timings, failures):
+  body, headers = None, {}
+  if data is not None:
+    body = urlencode(data)
+    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+  connection = _connect(url)
+  while time.perf_counter() < deadline:
+    started = time.perf_counter()
+    try:
+      connection.request(method, path, body=body, headers=headers)
+      response = connection.getresponse()
+      response.read()
+    except (OSError, HTTPException):
+      failures.append(time.perf_counter() - started)
+      connection.close()
+      connection = _connect(url)
+      continue
+    timings.append((time.perf_counter() - started, _statements(response), response.status))
+  connection.close()
+
+def measure(url, method, path, data, concurrency, duration):
+  # [(seconds, statements, status)] and the number of failed requests
+  timings, failures = [], []
+  deadline = time.perf_counter() + duration
+  clients = [threading.Thread(target=_client, args=(url, method, path, data, deadline, timings, failures))
+    for _ in range(concurrency)]
+  for client in clients:
+    client.start()
+  for client in clients:
+    client.join()
+  return timings, len(failures)
+
+def run(url, values, concurrency=32, duration=10.0, names=None, echo=print):
+  # {name: (method, path, status, [(seconds, statements)], duration)}
+  measured = {}
+  for name, _, method, template, data in ROUTES:
+    if names and name not in names:
+      continue
+    path = template.format(**values)
+    timings, failed = measure(url, method, path, data, concurrency, duration)
+    if not timings:
+      echo('{:<28} no successful requests ({} failed)'.format(name, failed))
+      continue
+    # the most common status stands for the route
+    status = Counter(status for _, _, status in timings).most_common(1)[0][0]
+    measured[name] = (method, path, status, [(seconds, statements) for seconds, statements, _ in timings],
+      duration)
+    echo('{:<28} {:>4} {:>8.1f} req/s {:>8.1f}ms p50{}'.format(name, status, len(timings) / duration,
+      sorted(seconds for seconds, _, _ in timings)[len(timings) // 2] * 1000,
+      ' ({} failed)'.format(failed) if failed else ''))
+  return measured
@@ -0,0 +1,117 @@
+import json
+import math
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+#----------------------------------------------------------------------------#
+# Results format.
+#----------------------------------------------------------------------------#
+
+# One JSON document per run, so runs from two commits can be compared:
+#
+#   {"format": 1, "commit": ..., "created_at": ..., "python": ..., "database": ...,
+#    "scale": {"venues": n, "artists": n, "shows": n},
+#    "settings": {"iterations": n, "warmup": n, "cache": bool},
+#    "routes": {name: {"method", "path", "status", "samples", "p50_ms", "p99_ms",
+#                      "mean_ms", "max_ms", "statements", "statements_max",
+#                      "requests_per_second" (load runs only)}},
+#    "uncovered": [url rules not exercised],
+#    "startup": {"runs": n, "interpreter"|"import"|"create_app"|"total": {"p50_ms", "max_ms"},
+#                "modules": n}}
+#
+# Either "routes" or "startup" may be empty, depending on the command.
+
+FORMAT = 1
+
+def percentile(sorted_values, fraction):
+  # nearest-rank percentile of an already sorted list
+  if not sorted_values:
+    return None
+  rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+  return sorted_values[rank]
+
+def summarize(method, path, status, timings, duration=None):
+  # duration: wall-clock seconds of a load run, for its throughput
+  seconds = sorted(elapsed for elapsed, _ in timings)
+  statements = sorted(count for _, count in timings if count is not None)
+  summary = {
+    "method": method,
+    "path": path,
+    "status": status,
+    "samples": len(seconds),
+    "p50_ms": round(percentile(seconds, 0.50) * 1000, 2),
+    "p99_ms": round(percentile(seconds, 0.99) * 1000, 2),
+    "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2),
+    "max_ms": round(seconds[-1] * 1000, 2),
+    "statements": percentile(statements, 0.50),
+    "statements_max": statements[-1] if statements else None,
+  }
+  if duration:
+    summary["requests_per_second"] = round(len(seconds) / duration, 1)
+  return summary
+
+def _commit():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+      cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+def document(measured, scale, database, settings, uncovered, startup=None):
+  return {
+    "format": FORMAT,
+    "commit": _commit(),
+    "created_at": datetime.now(timezone.utc).isoformat(),
+    "python": platform.python_version(),
+    "database": database,
+    "scale": scale,
+    "settings": settings,
+    "routes": {name: summarize(*result) for name, result in measured.items()},
+    "uncovered": uncovered,
+    "startup": startup,
+  }
+
+def save(results, path):
+  with open(path, 'w') as output:
+    json.dump(results, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+def load(path):
+  with open(path) as source:
+    results = json.load(source)
+  if results.get('format') != FORMAT:
+    raise ValueError('{} is not a format {} results file'.format(path, FORMAT))
+  return results
+
+#----------------------------------------------------------------------------#
+# Comparison.
+#----------------------------------------------------------------------------#
+
+def compare(old, new, threshold=1.25):
+  # [(route, what, old value, new value)] for routes that got slower by more
+  # than threshold at p50 or p99, lost as much throughput, or run more
+  # statements, and for a slower cold start
+  regressions = []
+  for name, after in sorted(new['routes'].items()):
+    before = old['routes'].get(name)
+    if before is None:
+      continue
+    for key in ('p50_ms', 'p99_ms'):
+      if before[key] and after[key] > before[key] * threshold:
+        regressions.append((name, key, before[key], after[key]))
+    if before.get('requests_per_second') and after.get('requests_per_second') is not None \
+        and after['requests_per_second'] * threshold < before['requests_per_second']:
+      regressions.append((name, 'requests_per_second', before['requests_per_second'],
+        after['requests_per_second']))
+    if before['statements'] is not None and after['statements'] is not None \
+        and after['statements'] > before['statements']:
+      regressions.append((name, 'statements', before['statements'], after['statements']))
+
+  if old.get('startup') and new.get('startup'):
+    for key in ('import', 'create_app', 'total'):
+      before, after = old['startup'][key]['p50_ms'], new['startup'][key]['p50_ms']
+      if before and after > before * threshold:
+        regressions.append(('startup', key + ' p50_ms', before, after))
+  return regressions
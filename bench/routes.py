@@ -0,0 +1,127 @@
+import re
+import time
+from urllib.parse import quote
+
+from sqlalchemy import func
+
+import queries
+from models import db, Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Routes under test.
+#----------------------------------------------------------------------------#
+
+# Every read route, with arguments taken from the loaded data: the busiest
+# venue and artist (the worst case for detail pages) and a typical one.
+# Write routes are left out so repeated runs see the same data.
+
+def _busiest(column):
+  return db.session.query(column).group_by(column).order_by(func.count().desc(), column).limit(1).scalar()
+
+def _median_id(model):
+  count = db.session.query(func.count(model.id)).scalar()
+  return db.session.query(model.id).order_by(model.id).offset(count // 2).limit(1).scalar()
+
+def sample():
+  # ids and values substituted into the route paths
+  busy_venue = _busiest(Show.venue_id)
+  city, state = db.session.query(Venue.city, Venue.state).filter(Venue.id == busy_venue).one()
+  latest = db.session.query(Show.start_time, Show.id).order_by(Show.start_time.desc(), Show.id.desc()) \
+    .offset(30).limit(1).first()
+  return {
+    "busy_venue": busy_venue,
+    "venue": _median_id(Venue),
+    "busy_artist": _busiest(Show.artist_id),
+    "artist": _median_id(Artist),
+    "city": city,
+    "state": state,
+    "cursor": queries.encode_cursor(*latest) if latest else '',
+  }
+
+# (name, url rule covered, method, path template, form data)
+ROUTES = (
+  ('home', '/', 'GET', '/', None),
+  ('venues', '/venues', 'GET', '/venues', None),
+  ('venues by genre', '/venues', 'GET', '/venues?genre=Jazz&genre=Blues&match=any', None),
+  ('venue search', '/venues/search', 'POST', '/venues/search', {"search_term": "the"}),
+  ('venues near', '/venues/near', 'GET', '/venues/near?city={city}&state={state}&miles=25', None),
+  ('suggest', '/search/suggest', 'GET', '/search/suggest?q=Bl', None),
+  ('venue detail, busiest', '/venues/<int:venue_id>', 'GET', '/venues/{busy_venue}', None),
+  ('venue detail', '/venues/<int:venue_id>', 'GET', '/venues/{venue}', None),
+  ('venue calendar', '/venues/<int:venue_id>/calendar', 'GET', '/venues/{busy_venue}/calendar', None),
+  ('venue edit form', '/venues/<int:venue_id>/edit', 'GET', '/venues/{venue}/edit', None),
+  ('venue create form', '/venues/create', 'GET', '/venues/create', None),
+  ('artists', '/artists', 'GET', '/artists', None),
+  ('artists by genre', '/artists', 'GET', '/artists?genre=Rock+n+Roll', None),
+  ('artist search', '/artists/search', 'POST', '/artists/search', {"search_term": "wolves"}),
+  ('artist detail, busiest', '/artists/<int:artist_id>', 'GET', '/artists/{busy_artist}', None),
+  ('artist detail', '/artists/<int:artist_id>', 'GET', '/artists/{artist}', None),
+  ('artist calendar', '/artists/<int:artist_id>/calendar', 'GET', '/artists/{busy_artist}/calendar', None),
+  ('artist edit form', '/artists/<int:artist_id>/edit', 'GET', '/artists/{artist}/edit', None),
+  ('artist create form', '/artists/create', 'GET', '/artists/create', None),
+  ('shows', '/shows', 'GET', '/shows', None),
+  ('shows, keyset page', '/shows', 'GET', '/shows?cursor={cursor}', None),
+  ('shows in a city', '/shows', 'GET', '/shows?city={city}', None),
+  ('show calendar', '/shows/calendar', 'GET', '/shows/calendar?bucket=week', None),
+  ('show create form', '/shows/create', 'GET', '/shows/create', None),
+  ('api venues', '/api/v1/venues', 'GET', '/api/v1/venues?limit=100', None),
+  ('api artists', '/api/v1/artists', 'GET', '/api/v1/artists?limit=100', None),
+  ('api venue', '/api/v1/venues/<int:venue_id>', 'GET', '/api/v1/venues/{busy_venue}', None),
+  ('api artist', '/api/v1/artists/<int:artist_id>', 'GET', '/api/v1/artists/{busy_artist}', None),
+  ('api shows', '/api/v1/shows', 'GET', '/api/v1/shows?limit=100', None),
+  ('api search', '/api/v1/search', 'GET', '/api/v1/search?q=blue', None),
+)
+
+# operational endpoints, not pages
+IGNORED_RULES = ('/static/<path:filename>', '/metrics', '/cache/stats', '/export/<kind>.<format>')
+
+def uncovered(app):
+  # GET rules the table above does not exercise
+  covered = set(rule for _, rule, _, _, _ in ROUTES)
+  return sorted(set(
+    rule.rule for rule in app.url_map.iter_rules()
+    if 'GET' in rule.methods and rule.rule not in covered and rule.rule not in IGNORED_RULES))
+
+#----------------------------------------------------------------------------#
+# Driver.
+#----------------------------------------------------------------------------#
+
+STATEMENTS = re.compile(r'desc="(\d+) queries"')
+
+def _statements(response):
+  # from the Server-Timing header written by instrumentation.py
+  match = STATEMENTS.search(response.headers.get('Server-Timing', ''))
+  return int(match.group(1)) if match else None
+
+def measure(client, method, path, data, iterations, warmup):
+  # [(seconds, statements)] and the last status code
+  timings, status = [], None
+  for position in range(warmup + iterations):
+    started = time.perf_counter()
+    response = client.open(path, method=method, data=data)
+    response.get_data()
+    elapsed = time.perf_counter() - started
+    status = response.status_code
+    if position >= warmup:
+      timings.append((elapsed, _statements(response)))
+  return timings, status
+
+def sample_values(app):
+  # sample() quoted for use in paths
+  with app.app_context():
+    sampled = {key: quote(str(value)) for key, value in sample().items()}
+    db.session.remove()
+  return sampled
+
+def run(app, iterations=50, warmup=5, echo=print):
+  # {name: (method, path, status, [(seconds, statements)])}
+  client = app.test_client()
+  values = sample_values(app)
+
+  measured = {}
+  for name, _, method, template, data in ROUTES:
+    path = template.format(**values)
+    timings, status = measure(client, method, path, data, iterations, warmup)
+    measured[name] = (method, path, status, timings)
+    echo('{:<28} {:>4} {:>8.1f}ms'.format(name, status, sorted(t for t, _ in timings)[len(timings) // 2] * 1000))
+  return measured
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench.results import percentile
+
+#----------------------------------------------------------------------------#
+# Cold start.
+#----------------------------------------------------------------------------#
+
+# Each run is a fresh interpreter, as for a new gunicorn worker: it times
+# 'import app' and create_app() separately and counts the modules loaded.
+# Nothing in either step may touch the database, so no server is needed.
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({"import": imported - started, "create": created - imported, "modules": len(sys.modules)}))
+'''
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(code):
+  started = time.perf_counter()
+  output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+  return time.perf_counter() - started, output
+
+def _stats(seconds):
+  seconds = sorted(seconds)
+  return {"p50_ms": round(percentile(seconds, 0.5) * 1000, 2), "max_ms": round(seconds[-1] * 1000, 2)}
+
+def measure(runs=10):
+  interpreter, imports, creates, totals, modules = [], [], [], [], None
+  for _ in range(runs):
+    interpreter.append(_run('pass')[0])
+    total, output = _run(PROBE)
+    probe = json.loads(output.decode().strip().splitlines()[-1])
+    totals.append(total)
+    imports.append(probe['import'])
+    creates.append(probe['create'])
+    modules = probe['modules']
+  return {
+    "runs": runs,
+    "interpreter": _stats(interpreter),
+    "import": _stats(imports),
+    "create_app": _stats(creates),
+    "total": _stats(totals),
+    "modules": modules,
+  }
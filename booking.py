@@ -0,0 +1,139 @@
+from bisect import bisect_left
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, or_
+
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Booking conflicts.
+#----------------------------------------------------------------------------#
+
+# A venue or artist can only be in one show at a time. The database enforces
+# it with two exclusion constraints on tstzrange(start_time, end_time) (see
+# migrations), backed by GiST indexes; find_conflicts() asks the same index
+# first so the form can say what clashed, and BatchValidator checks bulk
+# schedules in memory before they reach the database.
+
+DEFAULT_DURATION_MINUTES = 120
+
+def end_time_for(start_time, duration_minutes=None):
+  return start_time + timedelta(minutes=duration_minutes or DEFAULT_DURATION_MINUTES)
+
+def _aware(value):
+  # naive form input is local time, database values are timezone aware
+  return value if value.tzinfo is not None else value.astimezone()
+
+def _overlaps(start_time, end_time):
+  return func.tstzrange(Show.start_time, Show.end_time) \
+    .op('&&')(func.tstzrange(_aware(start_time), _aware(end_time)))
+
+def find_conflicts(venue_id, artist_id, start_time, end_time, exclude_id=None):
+  # shows that already hold the venue or the artist during [start, end)
+  query = db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+    .filter(or_(Show.venue_id == venue_id, Show.artist_id == artist_id)) \
+    .filter(_overlaps(start_time, end_time))
+  if exclude_id is not None:
+    query = query.filter(Show.id != exclude_id)
+  return query.order_by(Show.start_time).all()
+
+def is_booking_conflict(error):
+  # IntegrityError raised by one of the exclusion constraints
+  return getattr(getattr(error, 'orig', None), 'pgcode', None) == '23P01'
+
+#----------------------------------------------------------------------------#
+# In-memory interval index.
+#----------------------------------------------------------------------------#
+
+class IntervalIndex(object):
+  # Booked intervals per key (a venue or an artist id). Accepted intervals
+  # never overlap each other, so for each key they form one sorted sequence
+  # and a candidate only has to be compared with its two neighbours: the
+  # last interval starting before it and the first starting at or after it.
+
+  def __init__(self):
+    self._starts = {}
+    self._ends = {}
+
+  def __contains__(self, key):
+    return key in self._starts
+
+  def load(self, key, intervals):
+    intervals = sorted((_aware(start), _aware(end)) for start, end in intervals)
+    self._starts[key] = [start for start, _ in intervals]
+    self._ends[key] = [end for _, end in intervals]
+
+  def conflict(self, key, start_time, end_time):
+    # returns the overlapping (start, end) or None, in O(log n)
+    start_time, end_time = _aware(start_time), _aware(end_time)
+    starts = self._starts.get(key, [])
+    ends = self._ends.get(key, [])
+    position = bisect_left(starts, start_time)
+    if position > 0 and ends[position - 1] > start_time:
+      return starts[position - 1], ends[position - 1]
+    if position < len(starts) and starts[position] < end_time:
+      return starts[position], ends[position]
+    return None
+
+  def add(self, key, start_time, end_time):
+    start_time, end_time = _aware(start_time), _aware(end_time)
+    starts = self._starts.setdefault(key, [])
+    ends = self._ends.setdefault(key, [])
+    position = bisect_left(starts, start_time)
+    starts.insert(position, start_time)
+    ends.insert(position, end_time)
+
+class BatchValidator(object):
+  # checks a stream of new shows against each other and against the shows
+  # already booked; a key's existing bookings are read once, on first use
+
+  def __init__(self):
+    self.venues = IntervalIndex()
+    self.artists = IntervalIndex()
+
+  def _ensure(self, index, column, key):
+    if key not in index:
+      rows = db.session.query(Show.start_time, Show.end_time).filter(column == key).all()
+      index.load(key, rows)
+
+  def check(self, venue_id, artist_id, start_time, end_time):
+    # returns an error message, or None after reserving the slot
+    self._ensure(self.venues, Show.venue_id, venue_id)
+    self._ensure(self.artists, Show.artist_id, artist_id)
+    if self.venues.conflict(venue_id, start_time, end_time):
+      return 'venue {} is already booked at that time'.format(venue_id)
+    if self.artists.conflict(artist_id, start_time, end_time):
+      return 'artist {} is already booked at that time'.format(artist_id)
+    self.venues.add(venue_id, start_time, end_time)
+    self.artists.add(artist_id, start_time, end_time)
+    return None
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+booking_cli = AppGroup('booking', help='Inspect show bookings.')
+
+@booking_cli.command('conflicts')
+def conflicts_command():
+  """List shows that overlap an earlier show at the same venue or by the same artist."""
+  found = 0
+  for column in (Show.venue_id, Show.artist_id):
+    # a show clashes when it starts before the latest end among the shows
+    # that started before it for the same key
+    previous_end = func.max(Show.end_time).over(
+      partition_by=column, order_by=(Show.start_time, Show.id), rows=(None, -1))
+    ordered = db.session.query(Show.id, column.label('key'), Show.start_time,
+      previous_end.label('previous_end')).subquery()
+    rows = db.session.query(ordered) \
+      .filter(ordered.c.previous_end > ordered.c.start_time) \
+      .all()
+    for row in rows:
+      found += 1
+      click.echo('show {} overlaps an earlier show for {} {}'.format(row.id, column.key, row.key))
+  click.echo('{} conflicts'.format(found))
+
+def init_app(app):
+  app.cli.add_command(booking_cli)
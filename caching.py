@@ -0,0 +1,202 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import polling
+from models import db, Show, ArtistSummary, VenueSummary
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class LocalBackend(object):
+  # per-process LRU with a TTL on every entry; other workers only see an
+  # invalidation once their own copy expires, so keep the TTL short or use
+  # the shared backend when running more than one worker
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._counters = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      value, expires_at = entry
+      if expires_at < time.monotonic():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl):
+    with self._lock:
+      self._entries[key] = (value, time.monotonic() + ttl)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def delete(self, keys):
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+
+  def counter(self, key):
+    return self._counters.get(key, 0)
+
+  def incr(self, key):
+    # counters live outside the LRU so eviction can never reset them
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0) + 1
+      return self._counters[key]
+
+def _isoformat(value):
+  if hasattr(value, 'isoformat'):
+    return value.isoformat()
+  raise TypeError('{!r} is not JSON serializable'.format(value))
+
+class RedisBackend(object):
+  # shared between workers; values are stored as JSON so only plain
+  # view-model dicts and lists should be cached (datetimes come back as
+  # ISO strings, which the |datetime filter also accepts)
+
+  def __init__(self, url, prefix='fyyur:'):
+    import redis
+    self.client = redis.Redis.from_url(url)
+    self.prefix = prefix
+
+  def get(self, key):
+    raw = self.client.get(self.prefix + key)
+    return None if raw is None else json.loads(raw)
+
+  def set(self, key, value, ttl):
+    self.client.set(self.prefix + key, json.dumps(value, default=_isoformat), ex=int(ttl))
+
+  def delete(self, keys):
+    if keys:
+      self.client.delete(*[self.prefix + key for key in keys])
+
+  def counter(self, key):
+    return int(self.client.get(self.prefix + key) or 0)
+
+  def incr(self, key):
+    return self.client.incr(self.prefix + key)
+
+#----------------------------------------------------------------------------#
+# Cache.
+#----------------------------------------------------------------------------#
+
+class Cache(object):
+
+  def __init__(self):
+    self.backend = LocalBackend()
+    self.default_ttl = 60
+    self.hits = 0
+    self.misses = 0
+
+  def init_app(self, app):
+    app.config.setdefault('CACHE_BACKEND', 'local')
+    app.config.setdefault('CACHE_DEFAULT_TTL', 60)
+    app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+    app.config.setdefault('CACHE_SYNC_INTERVAL', 5)
+
+    self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+    if app.config['CACHE_BACKEND'] == 'redis':
+      self.backend = RedisBackend(app.config['CACHE_REDIS_URL'])
+      return
+    self.backend = LocalBackend(app.config['CACHE_MAX_ENTRIES'])
+    if app.config.get('JOBS_EAGER'):
+      return
+
+    @app.before_request
+    def drop_refreshed_pages():
+      sync_refreshed_pages(app.config['CACHE_SYNC_INTERVAL'])
+
+  def get_or_set(self, key, build, ttl=None):
+    # returns the cached value for key, building and storing it on a miss
+    value = self.backend.get(key)
+    if value is not None:
+      self.hits += 1
+      return value
+    self.misses += 1
+    value = build()
+    if value is not None:
+      self.backend.set(key, value, ttl or self.default_ttl)
+    return value
+
+  def delete(self, *keys):
+    self.backend.delete(keys)
+
+  def namespace(self, name):
+    # keys for families with unbounded members (e.g. one per feed cursor)
+    # carry a generation number; bump() drops the whole family at once
+    return '{}:{}'.format(name, self.backend.counter('ns:' + name))
+
+  def bump(self, name):
+    self.backend.incr('ns:' + name)
+
+  def stats(self):
+    return {"hits": self.hits, "misses": self.misses}
+
+cache = Cache()
+
+#----------------------------------------------------------------------------#
+# Keys.
+#----------------------------------------------------------------------------#
+
+def venue_key(venue_id):
+  return 'venue:{}'.format(venue_id)
+
+def artist_key(artist_id):
+  return 'artist:{}'.format(artist_id)
+
+def shows_key(cursor):
+  return '{}:{}'.format(cache.namespace('shows'), cursor or '')
+
+def _other_side(column, where):
+  # ids on the other side of the venue's (or artist's) shows
+  return [id for id, in db.session.query(column).filter(where).distinct()]
+
+def venue_changed(venue_id):
+  # name, city and state show up in the area listing, the show feed and
+  # the page of every artist with a show there
+  cache.delete('venues', venue_key(venue_id),
+    *[artist_key(id) for id in _other_side(Show.artist_id, Show.venue_id == venue_id)])
+  cache.bump('shows')
+
+def artist_changed(artist_id):
+  cache.delete('artists', artist_key(artist_id),
+    *[venue_key(id) for id in _other_side(Show.venue_id, Show.artist_id == artist_id)])
+  cache.bump('shows')
+
+def show_changed(venue_id, artist_id):
+  # the show appears in the feed, both detail pages and the venue counts
+  cache.delete('venues', venue_key(venue_id), artist_key(artist_id))
+  cache.bump('shows')
+
+#----------------------------------------------------------------------------#
+# Refreshes made by job workers.
+#----------------------------------------------------------------------------#
+
+# The summary jobs drop the detail pages once their summaries are fresh,
+# but a job worker's delete never reaches a web worker's LocalBackend. With
+# the local backend and JOBS_EAGER off, each web worker instead polls the
+# summaries' refreshed_at every CACHE_SYNC_INTERVAL seconds (see polling.py)
+# and drops the pages refreshed since its last look.
+
+SUMMARIES = (('venue', VenueSummary, venue_key), ('artist', ArtistSummary, artist_key))
+
+refresh_poller = polling.WatermarkPoller()
+
+def sync_refreshed_pages(interval):
+  if not refresh_poller.due(interval):
+    return
+  for kind, summary, key in SUMMARIES:
+    since, moved = refresh_poller.poll(kind, summary.refreshed_at)
+    if moved:
+      ids = db.session.query(summary.id).filter(summary.refreshed_at > since)
+      cache.delete(*[key(id) for id, in ids])
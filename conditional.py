@@ -0,0 +1,117 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from sqlalchemy import func
+
+import dates
+from models import db, Artist, Venue, Show, ArtistSummary, VenueSummary
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+# Each validator answers "has anything on this page changed?" with one
+# aggregate over the indexed updated_at columns: the newest updated_at of
+# every row the page shows, plus row counts so deletes change it too.
+# The past/upcoming split on detail pages moves when
+# 'flask counters roll-forward' touches the affected rows. Detail pages are
+# read from their summary row, which a job refreshes after the write
+# commits, so its refreshed_at counts too: a page served from the stale
+# summary in between never keeps its ETag.
+
+def _latest(*values):
+  values = [value for value in values if value is not None]
+  return max(values) if values else None
+
+def venues_validator():
+  latest, count = db.session.query(func.max(Venue.updated_at), func.count(Venue.id)).one()
+  return latest, (count,)
+
+def artists_validator():
+  latest, count = db.session.query(func.max(Artist.updated_at), func.count(Artist.id)).one()
+  return latest, (count,)
+
+def shows_validator():
+  latest_venue = db.session.query(func.max(Venue.updated_at)).as_scalar()
+  latest_artist = db.session.query(func.max(Artist.updated_at)).as_scalar()
+  row = db.session.query(func.max(Show.updated_at), func.count(Show.id), latest_venue, latest_artist).one()
+  return _latest(row[0], row[2], row[3]), (row[1],)
+
+def venue_validator(venue_id):
+  row = db.session.query(
+      Venue.updated_at,
+      func.max(Show.updated_at),
+      func.max(Artist.updated_at),
+      func.count(Show.id),
+      func.max(VenueSummary.refreshed_at)) \
+    .outerjoin(VenueSummary, VenueSummary.id == Venue.id) \
+    .outerjoin(Show, Show.venue_id == Venue.id) \
+    .outerjoin(Artist, Artist.id == Show.artist_id) \
+    .filter(Venue.id == venue_id) \
+    .group_by(Venue.id) \
+    .one_or_none()
+  if row is None:
+    return None, ()
+  return _latest(row[0], row[1], row[2], row[4]), (venue_id, row[3])
+
+def artist_validator(artist_id):
+  row = db.session.query(
+      Artist.updated_at,
+      func.max(Show.updated_at),
+      func.max(Venue.updated_at),
+      func.count(Show.id),
+      func.max(ArtistSummary.refreshed_at)) \
+    .outerjoin(ArtistSummary, ArtistSummary.id == Artist.id) \
+    .outerjoin(Show, Show.artist_id == Artist.id) \
+    .outerjoin(Venue, Venue.id == Show.venue_id) \
+    .filter(Artist.id == artist_id) \
+    .group_by(Artist.id) \
+    .one_or_none()
+  if row is None:
+    return None, ()
+  return _latest(row[0], row[1], row[2], row[4]), (artist_id, row[3])
+
+def _etag(last_modified, extra):
+  # the page is rendered in the client's locale and timezone
+  raw = '{}|{}|{}|{}'.format(request.full_path, last_modified.isoformat(), extra,
+    dates.request_locale(current_app))
+  return hashlib.sha1(raw.encode()).hexdigest()
+
+def conditional(validator):
+  # answers If-None-Match / If-Modified-Since with 304 before the view
+  # runs; otherwise tags the rendered response with ETag/Last-Modified
+  def decorator(view):
+    @wraps(view)
+    def wrapper(**kwargs):
+      # a pending flash message has to be rendered, never revalidated
+      if '_flashes' in session:
+        return view(**kwargs)
+
+      last_modified, extra = validator(**kwargs)
+      if last_modified is None:
+        return view(**kwargs)
+
+      # the ETag keeps full precision, so two edits within one second still
+      # change it; HTTP dates have whole-second precision and are always UTC
+      last_modified = last_modified.astimezone(timezone.utc).replace(tzinfo=None)
+      etag = _etag(last_modified, extra)
+      last_modified = last_modified.replace(microsecond=0)
+
+      if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+      else:
+        not_modified = request.if_modified_since is not None and \
+          last_modified <= request.if_modified_since.replace(tzinfo=None)
+
+      if not_modified:
+        response = make_response('', 304)
+      else:
+        response = make_response(view(**kwargs))
+      response.set_etag(etag)
+      response.last_modified = last_modified
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
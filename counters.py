@@ -0,0 +1,163 @@
+from datetime import datetime, timezone
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, func
+
+from models import db, Artist, Venue, Show, CounterWatermark
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue/Artist.upcoming_shows_count and past_shows_count are split at the
+# CounterWatermark.rolled_at instant rather than at "now": a show counts as
+# upcoming until roll_forward() moves the watermark past its start time.
+# Creating and deleting shows classify against the same watermark, so the
+# two paths can never count one show twice.
+
+OWNERS = ((Venue, Show.venue_id), (Artist, Show.artist_id))
+
+def _watermark(lock=False):
+  query = db.session.query(CounterWatermark).filter(CounterWatermark.id == 1)
+  if lock:
+    # roll_forward() takes the row exclusively, writers take it shared
+    query = query.with_for_update(read=(lock == 'share'))
+  watermark = query.one_or_none()
+  if watermark is None:
+    watermark = CounterWatermark(id=1, rolled_at=datetime.now(timezone.utc))
+    db.session.add(watermark)
+    db.session.flush()
+  return watermark
+
+def _is_upcoming(start_time, rolled_at):
+  if start_time.tzinfo is None:
+    start_time = start_time.astimezone()
+  return start_time > rolled_at
+
+def _adjust(show, delta):
+  rolled_at = _watermark(lock='share').rolled_at
+  column = 'upcoming_shows_count' if _is_upcoming(show.start_time, rolled_at) else 'past_shows_count'
+  for model, id in ((Venue, show.venue_id), (Artist, show.artist_id)):
+    counter = getattr(model, column)
+    db.session.query(model) \
+      .filter(model.id == id) \
+      .update({counter: counter + delta}, synchronize_session=False)
+
+def show_created(show):
+  # call inside the transaction that inserts the show
+  _adjust(show, 1)
+
+def show_deleted(show):
+  # call inside the transaction that deletes the show
+  _adjust(show, -1)
+
+def shows_created(shows):
+  # bulk version of show_created() for batches of show dicts: one
+  # executemany UPDATE per owner table instead of one per show
+  rolled_at = _watermark(lock='share').rolled_at
+  for model, fk in OWNERS:
+    deltas = {}
+    for show in shows:
+      delta = deltas.setdefault(show[fk.key], {"owner_id": show[fk.key], "upcoming": 0, "past": 0})
+      delta["upcoming" if _is_upcoming(show['start_time'], rolled_at) else "past"] += 1
+    if deltas:
+      db.session.execute(
+        model.__table__.update()
+          .where(model.__table__.c.id == bindparam('owner_id'))
+          .values(
+            upcoming_shows_count=model.__table__.c.upcoming_shows_count + bindparam('upcoming'),
+            past_shows_count=model.__table__.c.past_shows_count + bindparam('past')),
+        list(deltas.values()))
+
+def roll_forward(now=None):
+  # move shows that started since the last run from upcoming to past with
+  # one grouped UPDATE per owner table; returns the number of shows moved
+  now = now or datetime.now(timezone.utc)
+  watermark = _watermark(lock=True)
+  if now <= watermark.rolled_at:
+    db.session.commit()
+    return 0
+
+  moved = db.session.query(func.count(Show.id)) \
+    .filter(Show.start_time > watermark.rolled_at, Show.start_time <= now) \
+    .scalar()
+
+  for model, fk in OWNERS:
+    started = db.session.query(fk.label('id'), func.count(Show.id).label('n')) \
+      .filter(Show.start_time > watermark.rolled_at, Show.start_time <= now) \
+      .group_by(fk) \
+      .subquery()
+    db.session.query(model) \
+      .filter(model.id == started.c.id) \
+      .update({
+        model.upcoming_shows_count: model.upcoming_shows_count - started.c.n,
+        model.past_shows_count: model.past_shows_count + started.c.n
+      }, synchronize_session=False)
+
+  watermark.rolled_at = now
+  db.session.commit()
+  return moved
+
+def reconcile(fix=True):
+  # rebuild every counter from the Show table and report the rows that
+  # had drifted, as (table, id, stored upcoming/past, actual upcoming/past)
+  rolled_at = _watermark(lock=True).rolled_at
+  drift = []
+  for model, fk in OWNERS:
+    actual = db.session.query(
+        fk.label('id'),
+        func.count(Show.id).filter(Show.start_time > rolled_at).label('upcoming'),
+        func.count(Show.id).filter(Show.start_time <= rolled_at).label('past')) \
+      .group_by(fk) \
+      .subquery()
+    upcoming = func.coalesce(actual.c.upcoming, 0)
+    past = func.coalesce(actual.c.past, 0)
+
+    rows = db.session.query(
+        model.id,
+        model.upcoming_shows_count,
+        model.past_shows_count,
+        upcoming.label('upcoming'),
+        past.label('past')) \
+      .outerjoin(actual, actual.c.id == model.id) \
+      .filter((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past)) \
+      .all()
+
+    for row in rows:
+      drift.append((model.__tablename__, row.id,
+        (row.upcoming_shows_count, row.past_shows_count), (row.upcoming, row.past)))
+      if fix:
+        db.session.query(model) \
+          .filter(model.id == row.id) \
+          .update({model.upcoming_shows_count: row.upcoming, model.past_shows_count: row.past},
+            synchronize_session=False)
+
+  if fix:
+    db.session.commit()
+  else:
+    db.session.rollback()
+  return drift
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the denormalized show counters.')
+
+@counters_cli.command('roll-forward')
+def roll_forward_command():
+  """Move shows that have started from upcoming to past (run from cron)."""
+  click.echo('{} shows rolled forward'.format(roll_forward()))
+
+@counters_cli.command('reconcile')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+def reconcile_command(dry_run):
+  """Rebuild the counters from the Show table and report any drift."""
+  drift = reconcile(fix=not dry_run)
+  for table, id, stored, actual in drift:
+    click.echo('{} {}: stored upcoming/past {}/{}, actual {}/{}'.format(table, id, *(stored + actual)))
+  click.echo('{} rows drifted{}'.format(len(drift), '' if dry_run else ', fixed'))
+
+def init_app(app):
+  app.cli.add_command(counters_cli)
@@ -0,0 +1,91 @@
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# The |datetime filter takes datetimes as they come from the database (or
+# strings, for values that went through JSON). Babel patterns are compiled
+# once per (format, locale), and formatted results are kept in an LRU
+# keyed by (value, format, locale, timezone): a page listing hundreds of
+# shows formats each distinct start time once per worker.
+
+PATTERNS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+# Babel is imported on first use: it is only needed once a page renders a date
+
+@lru_cache(maxsize=64)
+def _locale(name):
+  from babel import Locale
+  return Locale.parse(name)
+
+@lru_cache(maxsize=64)
+def _timezone(name):
+  from babel.dates import get_timezone
+  return get_timezone(name)
+
+@lru_cache(maxsize=256)
+def _pattern(format, locale):
+  # returns (compiled pattern, Locale)
+  from babel.dates import parse_pattern
+  return parse_pattern(PATTERNS.get(format, format)), _locale(locale)
+
+@lru_cache(maxsize=4096)
+def _parse(value):
+  import dateutil.parser
+  return dateutil.parser.parse(value)
+
+@lru_cache(maxsize=8192)
+def _format(value, format, locale, timezone):
+  if isinstance(value, str):
+    value = _parse(value)
+  if value.tzinfo is not None:
+    # naive values are already in display time, aware ones are converted
+    value = value.astimezone(_timezone(timezone))
+  pattern, locale = _pattern(format, locale)
+  return pattern.apply(value, locale)
+
+def format_datetime(value, format='medium', locale='en', timezone='UTC'):
+  if value is None or value == '':
+    return ''
+  return _format(value, format, locale, timezone)
+
+#----------------------------------------------------------------------------#
+# Request locale and timezone.
+#----------------------------------------------------------------------------#
+
+TIMEZONE_COOKIE = 'tz'
+
+def _choose(app):
+  # (locale, timezone) from Accept-Language and the tz cookie, falling back
+  # to the configured defaults
+  locale = request.accept_languages.best_match(app.config['LOCALES']) or app.config['DEFAULT_LOCALE']
+  timezone = request.cookies.get(TIMEZONE_COOKIE) or app.config['DEFAULT_TIMEZONE']
+  try:
+    _timezone(timezone)
+  except LookupError:
+    timezone = app.config['DEFAULT_TIMEZONE']
+  return locale, timezone
+
+def request_locale(app):
+  if not has_request_context():
+    return app.config['DEFAULT_LOCALE'], app.config['DEFAULT_TIMEZONE']
+  if 'display_locale' not in g:
+    g.display_locale = _choose(app)
+  return g.display_locale
+
+def init_app(app):
+  app.config.setdefault('LOCALES', ['en'])
+  app.config.setdefault('DEFAULT_LOCALE', 'en')
+  app.config.setdefault('DEFAULT_TIMEZONE', 'UTC')
+
+  def datetime_filter(value, format='medium'):
+    locale, timezone = request_locale(app)
+    return format_datetime(value, format, locale, timezone)
+
+  app.jinja_env.filters['datetime'] = datetime_filter
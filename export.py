@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+
+import click
+from flask import Blueprint, Response, abort, request, stream_with_context
+from flask.cli import AppGroup
+
+from models import db, Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Export queries.
+#----------------------------------------------------------------------------#
+
+VENUE_COLUMNS = ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+  'facebook_link', 'image_link', 'seeking_talent', 'seeking_description')
+ARTIST_COLUMNS = ('id', 'name', 'city', 'state', 'phone', 'genres', 'website',
+  'facebook_link', 'image_link', 'seeking_venue', 'seeking_description')
+SHOW_COLUMNS = ('id', 'start_time', 'venue_id', 'venue_name', 'venue_city', 'venue_state',
+  'artist_id', 'artist_name')
+
+def _venues(city=None, start=None, end=None):
+  query = db.session.query(*[getattr(Venue, column) for column in VENUE_COLUMNS])
+  if city:
+    query = query.filter(Venue.city == city)
+  return VENUE_COLUMNS, query.order_by(Venue.id)
+
+def _artists(city=None, start=None, end=None):
+  query = db.session.query(*[getattr(Artist, column) for column in ARTIST_COLUMNS])
+  if city:
+    query = query.filter(Artist.city == city)
+  return ARTIST_COLUMNS, query.order_by(Artist.id)
+
+def _shows(city=None, start=None, end=None):
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Venue.city.label('venue_city'),
+      Venue.state.label('venue_state'),
+      Show.artist_id,
+      Artist.name.label('artist_name')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+  if city:
+    query = query.filter(Venue.city == city)
+  if start:
+    query = query.filter(Show.start_time >= start)
+  if end:
+    query = query.filter(Show.start_time < end)
+  return SHOW_COLUMNS, query.order_by(Show.start_time, Show.id)
+
+EXPORTS = {
+  'venues': _venues,
+  'artists': _artists,
+  'shows': _shows,
+}
+
+def export_rows(kind, city=None, start=None, end=None, batch_size=1000):
+  # rows come from a server-side cursor in batches, so memory stays flat
+  # however large the table is
+  columns, query = EXPORTS[kind](city=city, start=start, end=end)
+  rows = query.execution_options(stream_results=True).yield_per(batch_size)
+  return columns, rows
+
+#----------------------------------------------------------------------------#
+# Encoders.
+#----------------------------------------------------------------------------#
+
+def _value(value):
+  if hasattr(value, 'isoformat'):
+    return value.isoformat()
+  return value
+
+def iter_csv(columns, rows):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for row in rows:
+    writer.writerow([
+      ';'.join(value) if isinstance(value, list) else _value(value)
+      for value in row])
+    # hand each line over as soon as it is written
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+  yield buffer.getvalue()
+
+def iter_ndjson(columns, rows):
+  for row in rows:
+    yield json.dumps({column: _value(value) for column, value in zip(columns, row)}) + '\n'
+
+FORMATS = {
+  'csv': (iter_csv, 'text/csv'),
+  'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+
+def _parse_date(value):
+  import dateutil.parser
+  return dateutil.parser.parse(value) if value else None
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+exports = Blueprint('export', __name__, url_prefix='/export')
+
+@exports.route('/<kind>.<format>')
+def export(kind, format):
+  if kind not in EXPORTS or format not in FORMATS:
+    abort(404)
+  try:
+    start = _parse_date(request.args.get('from'))
+    end = _parse_date(request.args.get('to'))
+  except (ValueError, OverflowError):
+    abort(400)
+
+  encode, mimetype = FORMATS[format]
+  columns, rows = export_rows(kind, city=request.args.get('city'), start=start, end=end)
+  response = Response(stream_with_context(encode(columns, rows)), mimetype=mimetype)
+  response.headers['Content-Disposition'] = 'attachment; filename={}.{}'.format(kind, format)
+  return response
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+export_cli = AppGroup('export', help='Export the catalog.')
+
+@export_cli.command('dump')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option('--format', 'format', type=click.Choice(sorted(FORMATS)), default='csv')
+@click.option('--from', 'start', help='Only shows starting on or after this date.')
+@click.option('--to', 'end', help='Only shows starting before this date.')
+@click.option('--city', help='Only rows in this city.')
+@click.option('--output', '-o', type=click.File('w'), default='-')
+def dump_command(kind, format, start, end, city, output):
+  """Stream venues, artists or shows to a file (stdout by default)."""
+  encode, _ = FORMATS[format]
+  columns, rows = export_rows(kind, city=city, start=_parse_date(start), end=_parse_date(end))
+  for chunk in encode(columns, rows):
+    output.write(chunk)
+
+def init_app(app):
+  app.register_blueprint(exports)
+  app.cli.add_command(export_cli)
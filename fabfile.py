@@ -6,13 +6,19 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        result = local("python -m pytest tests/", capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(baseline=None):
+    # time every read route against the database in FLASK_APP's config;
+    # with a baseline results file, fail on regressions
+    local("flask bench routes -o bench_results.json")
+    if baseline:
+        local("flask bench compare {} bench_results.json".format(baseline))
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -1,7 +1,25 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
+
+class DateTimeFormatsField(DateTimeField):
+    # a DateTimeField that accepts several formats, tried in order
+    def __init__(self, label=None, validators=None, formats=('%Y-%m-%d %H:%M:%S',), **kwargs):
+        super(DateTimeFormatsField, self).__init__(label, validators, format=formats[0], **kwargs)
+        self.formats = formats
+
+    def process_formdata(self, valuelist):
+        if valuelist:
+            date_str = ' '.join(valuelist).strip()
+            for format in self.formats:
+                try:
+                    self.data = datetime.strptime(date_str, format)
+                    return
+                except ValueError:
+                    pass
+            self.data = None
+            raise ValueError(self.gettext('Not a valid datetime value'))
 
 class ShowForm(Form):
     artist_id = StringField(
@@ -10,11 +28,19 @@ class ShowForm(Form):
     venue_id = StringField(
         'venue_id'
     )
-    start_time = DateTimeField(
+    # the placeholder asks for YYYY-MM-DD HH:MM; seconds and the
+    # datetime-local 'T' separator are accepted too
+    start_time = DateTimeFormatsField(
         'start_time',
         validators=[DataRequired()],
+        formats=('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%dT%H:%M:%S'),
         default= datetime.today()
     )
+    duration_minutes = IntegerField(
+        'duration_minutes',
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)],
+        default=120
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -0,0 +1,255 @@
+import csv
+import math
+import os
+import threading
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, or_
+
+from models import db, Venue
+
+#----------------------------------------------------------------------------#
+# Offline geocoding.
+#----------------------------------------------------------------------------#
+
+# City centres from data/us_cities.csv; no network lookups are ever made.
+# A venue gets its city's coordinates, which is as precise as the free-text
+# address allows without an external geocoder.
+
+DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'us_cities.csv')
+EARTH_RADIUS_MILES = 3958.8
+
+_places = None
+
+def _key(city, state):
+  return ' '.join((city or '').lower().split()), (state or '').upper()
+
+def places():
+  global _places
+  if _places is None:
+    with open(DATASET, newline='') as dataset:
+      _places = {
+        _key(row['city'], row['state']): (float(row['latitude']), float(row['longitude']))
+        for row in csv.DictReader(dataset)}
+  return _places
+
+def geocode(city, state):
+  return places().get(_key(city, state))
+
+def locate(venue):
+  # fills in latitude/longitude/geohash from the venue's city; returns
+  # False when the city is not in the dataset
+  point = geocode(venue.city, venue.state)
+  if point is None:
+    venue.latitude = venue.longitude = venue.geohash = None
+    return False
+  venue.latitude, venue.longitude = point
+  venue.geohash = geohash_encode(*point)
+  return True
+
+#----------------------------------------------------------------------------#
+# Geohash.
+#----------------------------------------------------------------------------#
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+
+def geohash_encode(latitude, longitude, precision=PRECISION):
+  lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+  code, bits, value, even = [], 0, 0, True
+  while len(code) < precision:
+    target, span = (longitude, lng_range) if even else (latitude, lat_range)
+    middle = (span[0] + span[1]) / 2
+    value <<= 1
+    if target >= middle:
+      value |= 1
+      span[0] = middle
+    else:
+      span[1] = middle
+    even = not even
+    bits += 1
+    if bits == 5:
+      code.append(BASE32[value])
+      bits, value = 0, 0
+  return ''.join(code)
+
+def _cell_size(precision):
+  # (height, width) of a cell in degrees
+  lat_bits = 5 * precision // 2
+  lng_bits = 5 * precision - lat_bits
+  return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+def _prefixes(latitude, longitude, miles):
+  # the finest precision whose cells are at least the radius across, then
+  # the cell holding the point and its eight neighbours: every point within
+  # the radius lies in one of them. A circle around a pole, or wider than
+  # the coarsest cells, has no such cover; {''} then matches every venue.
+  radius_lat = miles / 69.0
+  if abs(latitude) + radius_lat >= 90.0:
+    return {''}
+  radius_lng = miles / (69.0 * math.cos(math.radians(abs(latitude) + radius_lat)))
+  precision = None
+  for candidate in range(PRECISION, 0, -1):
+    height, width = _cell_size(candidate)
+    if height >= radius_lat and width >= radius_lng:
+      precision = candidate
+      break
+  if precision is None:
+    return {''}
+  height, width = _cell_size(precision)
+  return set(
+    geohash_encode(
+      max(min(latitude + dlat * height, 89.999999), -89.999999),
+      (longitude + dlng * width + 180.0) % 360.0 - 180.0,
+      precision)
+    for dlat in (-1, 0, 1) for dlng in (-1, 0, 1))
+
+def distance_miles(lat1, lng1, lat2, lng2):
+  lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+  a = math.sin((lat2 - lat1) / 2) ** 2 + \
+    math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+  return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+#----------------------------------------------------------------------------#
+# KD-tree fallback.
+#----------------------------------------------------------------------------#
+
+def _unit_vector(latitude, longitude):
+  latitude, longitude = math.radians(latitude), math.radians(longitude)
+  return (math.cos(latitude) * math.cos(longitude),
+          math.cos(latitude) * math.sin(longitude),
+          math.sin(latitude))
+
+class KDTree(object):
+  # 3-d tree over points on the unit sphere, so straight-line (chord)
+  # distance orders exactly like great-circle distance
+
+  def __init__(self, items):
+    # items: [(latitude, longitude, payload)]
+    points = [(_unit_vector(lat, lng), (lat, lng, payload)) for lat, lng, payload in items]
+    self.root = self._build(points, 0)
+
+  def _build(self, points, depth):
+    if not points:
+      return None
+    axis = depth % 3
+    points.sort(key=lambda point: point[0][axis])
+    middle = len(points) // 2
+    return (points[middle], axis,
+      self._build(points[:middle], depth + 1),
+      self._build(points[middle + 1:], depth + 1))
+
+  def within(self, latitude, longitude, miles):
+    # chord length equivalent of the radius on the unit sphere
+    chord = 2 * math.sin(min(miles / EARTH_RADIUS_MILES, math.pi) / 2)
+    target = _unit_vector(latitude, longitude)
+    found = []
+    stack = [self.root]
+    while stack:
+      node = stack.pop()
+      if node is None:
+        continue
+      (vector, item), axis, left, right = node
+      if sum((a - b) ** 2 for a, b in zip(vector, target)) <= chord ** 2:
+        found.append(item)
+      offset = target[axis] - vector[axis]
+      stack.append(left if offset < 0 else right)
+      if abs(offset) <= chord:
+        stack.append(right if offset < 0 else left)
+    return found
+
+# The tree is per process. venue_moved() drops it in the worker that made a
+# change; changes made anywhere else (other workers, the CLI) are noticed
+# through the Venue table's (max updated_at, row count), checked at most
+# once per GEO_TREE_CHECK_INTERVAL seconds. updated_at also moves with the
+# show counters, so a busy catalog rebuilds about that often.
+
+_tree = None
+_tree_mark = None
+_tree_checked_at = None
+_tree_lock = threading.Lock()
+
+def _venue_mark():
+  return tuple(db.session.query(func.max(Venue.updated_at), func.count(Venue.id)).one())
+
+def _venue_tree(check_interval=30):
+  global _tree, _tree_mark, _tree_checked_at
+  with _tree_lock:
+    now = time.monotonic()
+    if _tree is not None and (_tree_checked_at is None or now - _tree_checked_at >= check_interval):
+      _tree_checked_at = now
+      if _venue_mark() != _tree_mark:
+        _tree = None
+    if _tree is None:
+      _tree_mark, _tree_checked_at = _venue_mark(), now
+      rows = db.session.query(Venue.latitude, Venue.longitude, Venue.id, Venue.name) \
+        .filter(Venue.latitude.isnot(None)).all()
+      _tree = KDTree([(row.latitude, row.longitude, (row.id, row.name)) for row in rows])
+    return _tree
+
+def venue_moved():
+  # the next in-memory search in this process rebuilds the tree
+  global _tree
+  with _tree_lock:
+    _tree = None
+
+#----------------------------------------------------------------------------#
+# Radius search.
+#----------------------------------------------------------------------------#
+
+def _geohash_candidates(latitude, longitude, miles):
+  # index range scans on the geohash column, one per covering cell
+  prefixes = _prefixes(latitude, longitude, miles)
+  rows = db.session.query(Venue.id, Venue.name, Venue.latitude, Venue.longitude) \
+    .filter(or_(*[Venue.geohash.like(prefix + '%') for prefix in prefixes])) \
+    .all()
+  return [(row.latitude, row.longitude, (row.id, row.name)) for row in rows]
+
+def venues_within(latitude, longitude, miles, limit=50, backend='geohash', check_interval=30):
+  # venues within the radius, nearest first, with their distance
+  if backend == 'kdtree':
+    candidates = _venue_tree(check_interval).within(latitude, longitude, miles)
+  else:
+    candidates = _geohash_candidates(latitude, longitude, miles)
+
+  results = []
+  for venue_lat, venue_lng, (id, name) in candidates:
+    distance = distance_miles(latitude, longitude, venue_lat, venue_lng)
+    if distance <= miles:
+      results.append({"id": id, "name": name, "distance_miles": round(distance, 1)})
+  results.sort(key=lambda venue: venue['distance_miles'])
+  return results[:limit]
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+geo_cli = AppGroup('geo', help='Venue coordinates.')
+
+@geo_cli.command('geocode')
+@click.option('--all', 'everything', is_flag=True, help='Redo venues that already have coordinates.')
+@click.option('--batch-size', default=1000, show_default=True)
+def geocode_command(everything, batch_size):
+  """Fill in venue coordinates from the bundled city dataset."""
+  query = db.session.query(Venue)
+  if not everything:
+    query = query.filter(Venue.latitude.is_(None))
+
+  located = missing = 0
+  for position, venue in enumerate(query.yield_per(batch_size), start=1):
+    if locate(venue):
+      located += 1
+    else:
+      missing += 1
+    if position % batch_size == 0:
+      db.session.flush()
+  db.session.commit()
+  venue_moved()
+  click.echo('{} venues located, {} cities not in the dataset'.format(located, missing))
+
+def init_app(app):
+  app.config.setdefault('GEO_SEARCH_BACKEND', 'geohash')
+  app.config.setdefault('GEO_TREE_CHECK_INTERVAL', 30)
+  app.cli.add_command(geo_cli)
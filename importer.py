@@ -0,0 +1,271 @@
+import csv
+import io
+import json
+
+import click
+from flask import Blueprint, abort, jsonify, request
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+import booking
+import caching
+import geo
+import counters
+import suggest
+import summaries
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Row mapping.
+#----------------------------------------------------------------------------#
+
+# Rows use the same field names as the HTML forms; genres may be given as a
+# list (NDJSON) or as a ';'-separated string (CSV).
+
+def venue_values(form):
+  point = geo.geocode(form.city.data, form.state.data)
+  return {
+    "name": form.name.data,
+    "genres": form.genres.data,
+    "address": form.address.data,
+    "city": form.city.data,
+    "state": form.state.data,
+    "phone": form.phone.data,
+    "website": form.website_link.data,
+    "facebook_link": form.facebook_link.data,
+    "seeking_talent": form.seeking_talent.data,
+    "seeking_description": form.seeking_description.data,
+    "image_link": form.image_link.data,
+    "latitude": point[0] if point else None,
+    "longitude": point[1] if point else None,
+    "geohash": geo.geohash_encode(*point) if point else None
+  }
+
+def artist_values(form):
+  return {
+    "name": form.name.data,
+    "genres": form.genres.data,
+    "city": form.city.data,
+    "state": form.state.data,
+    "phone": form.phone.data,
+    "website": form.website_link.data,
+    "facebook_link": form.facebook_link.data,
+    "seeking_venue": form.seeking_venue.data,
+    "seeking_description": form.seeking_description.data,
+    "image_link": form.image_link.data
+  }
+
+def show_values(form):
+  return {
+    "venue_id": int(form.venue_id.data),
+    "artist_id": int(form.artist_id.data),
+    "start_time": form.start_time.data,
+    "end_time": booking.end_time_for(form.start_time.data, form.duration_minutes.data)
+  }
+
+KINDS = {
+  'venues': (Venue, VenueForm, venue_values),
+  'artists': (Artist, ArtistForm, artist_values),
+  'shows': (Show, ShowForm, show_values),
+}
+
+def _formdata(row):
+  data = MultiDict()
+  for key, value in row.items():
+    if key == 'genres' and isinstance(value, str):
+      value = [genre.strip() for genre in value.split(';') if genre.strip()]
+    if isinstance(value, list):
+      for item in value:
+        data.add(key, item)
+    elif value is not None:
+      data.add(key, str(value))
+  return data
+
+#----------------------------------------------------------------------------#
+# Readers.
+#----------------------------------------------------------------------------#
+
+def read_csv(stream):
+  return csv.DictReader(stream)
+
+def read_ndjson(stream):
+  for line in stream:
+    if line.strip():
+      yield json.loads(line)
+
+READERS = {
+  'csv': read_csv,
+  'ndjson': read_ndjson,
+}
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+class ImportReport(object):
+
+  def __init__(self):
+    self.inserted = 0
+    self.errors = []
+
+  def as_dict(self):
+    return {
+      "inserted": self.inserted,
+      "failed": len(self.errors),
+      "errors": [{"row": row, "errors": errors} for row, errors in self.errors]
+    }
+
+def _validate(kind, rows, report):
+  # yields (row number, column values) for rows that pass the form rules
+  model, form_class, values = KINDS[kind]
+  if kind == 'shows':
+    venue_ids = set(id for id, in db.session.query(Venue.id))
+    artist_ids = set(id for id, in db.session.query(Artist.id))
+    schedule = booking.BatchValidator()
+
+  for number, row in enumerate(rows, start=1):
+    form = form_class(formdata=_formdata(row), meta={'csrf': False})
+    if not form.validate():
+      report.errors.append((number, form.errors))
+      continue
+    if kind == 'shows':
+      try:
+        show = values(form)
+      except (TypeError, ValueError):
+        report.errors.append((number, {"venue_id": ["must be an id"], "artist_id": ["must be an id"]}))
+        continue
+      if show['venue_id'] not in venue_ids or show['artist_id'] not in artist_ids:
+        report.errors.append((number, {"venue_id": ["unknown venue or artist"]}))
+        continue
+      conflict = schedule.check(show['venue_id'], show['artist_id'], show['start_time'], show['end_time'])
+      if conflict:
+        report.errors.append((number, {"start_time": [conflict]}))
+        continue
+      yield number, show
+    else:
+      yield number, values(form)
+
+CONFLICT = {"start_time": ["conflicts with a show booked during the import"]}
+
+def _insert(model, values, returning):
+  # one multi-row INSERT ... RETURNING inside its own savepoint
+  with db.session.begin_nested():
+    return db.session.execute(model.__table__.insert().values(values).returning(*returning)).fetchall()
+
+def _insert_batch(model, batch, returning, report):
+  # (values inserted, rows returned); a booking made by someone else since
+  # validation fails the batch's savepoint, and the batch is then retried a
+  # row at a time so only the conflicting rows are reported
+  values = [row for _, row in batch]
+  try:
+    return values, _insert(model, values, returning)
+  except IntegrityError as error:
+    if not booking.is_booking_conflict(error):
+      raise
+
+  kept, inserted = [], []
+  for number, row in batch:
+    try:
+      inserted.extend(_insert(model, [row], returning))
+    except IntegrityError as error:
+      if not booking.is_booking_conflict(error):
+        raise
+      report.errors.append((number, CONFLICT))
+      continue
+    kept.append(row)
+  return kept, inserted
+
+def _flush(kind, batch, report):
+  # the batch's rows are committed together with the counter updates and
+  # the page summary job for them
+  model = KINDS[kind][0]
+  returning = (model.__table__.c.id, model.__table__.c.name) if kind != 'shows' else (model.__table__.c.id,)
+  try:
+    values, inserted = _insert_batch(model, batch, returning, report)
+  except IntegrityError:
+    db.session.rollback()
+    raise
+  if not inserted:
+    db.session.rollback()
+    return
+  if kind == 'shows':
+    counters.shows_created(values)
+    summaries.defer_pages(set(row['venue_id'] for row in values), set(row['artist_id'] for row in values))
+  elif kind == 'venues':
+    summaries.defer_pages(venue_ids=[row.id for row in inserted])
+  else:
+    summaries.defer_pages(artist_ids=[row.id for row in inserted])
+  db.session.commit()
+  report.inserted += len(inserted)
+
+  if kind != 'shows':
+    for row in inserted:
+      suggest.index.add(kind[:-1], row.id, row.name)
+  if kind == 'venues':
+    geo.venue_moved()
+
+def import_rows(kind, rows, batch_size=1000, dry_run=False):
+  report = ImportReport()
+  batch = []
+  for item in _validate(kind, rows, report):
+    batch.append(item)
+    if len(batch) >= batch_size and not dry_run:
+      _flush(kind, batch, report)
+      batch = []
+  if batch and not dry_run:
+    _flush(kind, batch, report)
+
+  if report.inserted:
+    caching.cache.delete('venues', 'artists')
+    caching.cache.bump('shows')
+  return report
+
+#----------------------------------------------------------------------------#
+# Endpoint.
+#----------------------------------------------------------------------------#
+
+imports = Blueprint('import', __name__, url_prefix='/import')
+
+@imports.route('/<kind>', methods=['POST'])
+def upload(kind):
+  upload = request.files.get('file')
+  if kind not in KINDS or upload is None:
+    abort(400)
+  format = request.form.get('format') or upload.filename.rsplit('.', 1)[-1].lower()
+  if format not in READERS:
+    abort(400)
+
+  stream = io.TextIOWrapper(upload.stream, encoding='utf-8')
+  report = import_rows(kind, READERS[format](stream), dry_run=bool(request.form.get('dry_run')))
+  return jsonify(report.as_dict())
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+import_cli = AppGroup('import', help='Bulk import venues, artists and shows.')
+
+@import_cli.command('load')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(sorted(READERS)),
+  help='Input format (defaults to the file extension).')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Validate only, write nothing.')
+def load_command(kind, source, format, batch_size, dry_run):
+  """Validate and insert rows from a CSV or NDJSON file."""
+  format = format or source.name.rsplit('.', 1)[-1].lower()
+  if format not in READERS:
+    raise click.UsageError('cannot tell the format of {}, pass --format'.format(source.name))
+
+  report = import_rows(kind, READERS[format](source), batch_size=batch_size, dry_run=dry_run)
+  for row, errors in report.errors:
+    click.echo('row {}: {}'.format(row, '; '.join(
+      '{}: {}'.format(field, ', '.join(messages)) for field, messages in errors.items())), err=True)
+  click.echo('{} inserted, {} rejected'.format(report.inserted, len(report.errors)))
+
+def init_app(app):
+  app.register_blueprint(imports)
+  app.cli.add_command(import_cli)
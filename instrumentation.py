@@ -0,0 +1,145 @@
+import heapq
+import logging
+import time
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Per-request statistics.
+#----------------------------------------------------------------------------#
+
+# Every statement and template render inside a request is timed into
+# g.request_stats. The totals go out as a Server-Timing header, feed the
+# /metrics histograms, and requests slower than SLOW_REQUEST_MS are logged
+# with their slowest statements, which is usually enough to spot an N+1.
+
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds',
+  'Request latency by endpoint.', labels=('endpoint', 'method'))
+REQUEST_STATEMENTS = metrics.histogram('http_request_db_statements',
+  'SQL statements executed per request.', labels=('endpoint',),
+  buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89))
+REQUEST_DB_SECONDS = metrics.histogram('http_request_db_seconds',
+  'Time spent in SQL statements per request.', labels=('endpoint',))
+SLOW_REQUESTS = metrics.counter('http_slow_requests_total',
+  'Requests slower than SLOW_REQUEST_MS.', labels=('endpoint',))
+
+class RequestStats(object):
+
+  def __init__(self, keep=5):
+    self.started = time.perf_counter()
+    self.statements = 0
+    self.db_seconds = 0.0
+    self.template_seconds = 0.0
+    self.keep = keep
+    # (seconds, order, statement) min-heap of the slowest statements
+    self._slowest = []
+
+  def statement(self, seconds, statement):
+    self.statements += 1
+    self.db_seconds += seconds
+    entry = (seconds, self.statements, statement)
+    if len(self._slowest) < self.keep:
+      heapq.heappush(self._slowest, entry)
+    elif entry > self._slowest[0]:
+      heapq.heapreplace(self._slowest, entry)
+
+  def slowest(self):
+    return [(seconds, statement) for seconds, _, statement in sorted(self._slowest, reverse=True)]
+
+  def elapsed(self):
+    return time.perf_counter() - self.started
+
+def current():
+  # the stats of the request in progress, or None
+  return g.get('request_stats') if has_request_context() else None
+
+#----------------------------------------------------------------------------#
+# Hooks.
+#----------------------------------------------------------------------------#
+
+# Start times are a stack per connection, as sequence and default
+# executions run inside another statement. A statement that raises never
+# reaches after_cursor_execute, so handle_error takes its entry off instead
+# (and still counts it: a cancelled query spent its time in the database).
+
+def _record(started, statement):
+  stats = current()
+  if stats is not None:
+    stats.statement(time.perf_counter() - started, statement)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append((statement, time.perf_counter()))
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  _, started = conn.info['query_started'].pop()
+  _record(started, statement)
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+  # only a statement that reached the cursor has an entry; errors before
+  # that, or after after_cursor_execute, leave the stack alone
+  conn = exception_context.connection
+  pending = conn.info.get('query_started') if conn is not None else None
+  if pending and pending[-1][0] is exception_context.statement:
+    _, started = pending.pop()
+    _record(started, exception_context.statement)
+
+def _before_render(app, template, context, **extra):
+  stats = current()
+  if stats is not None:
+    g.template_started = time.perf_counter()
+
+def _rendered(app, template, context, **extra):
+  stats = current()
+  if stats is not None and g.get('template_started') is not None:
+    stats.template_seconds += time.perf_counter() - g.template_started
+    g.template_started = None
+
+def _server_timing(stats, total):
+  return ', '.join([
+    'db;dur={:.1f};desc="{} queries"'.format(stats.db_seconds * 1000, stats.statements),
+    'tpl;dur={:.1f}'.format(stats.template_seconds * 1000),
+    'total;dur={:.1f}'.format(total * 1000),
+  ])
+
+def init_app(app):
+  app.config.setdefault('SERVER_TIMING', True)
+  app.config.setdefault('SLOW_REQUEST_MS', 500)
+  app.config.setdefault('SLOW_REQUEST_STATEMENTS', 5)
+
+  before_render_template.connect(_before_render, app)
+  template_rendered.connect(_rendered, app)
+
+  @app.before_request
+  def start_stats():
+    g.request_stats = RequestStats(keep=app.config['SLOW_REQUEST_STATEMENTS'])
+
+  @app.after_request
+  def record_stats(response):
+    stats = g.get('request_stats')
+    if stats is None:
+      return response
+    total = stats.elapsed()
+    endpoint = request.endpoint or 'unmatched'
+    REQUEST_SECONDS.observe(total, endpoint, request.method)
+    REQUEST_STATEMENTS.observe(stats.statements, endpoint)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint)
+    if app.config['SERVER_TIMING']:
+      response.headers['Server-Timing'] = _server_timing(stats, total)
+
+    if total * 1000 >= app.config['SLOW_REQUEST_MS']:
+      SLOW_REQUESTS.inc(endpoint)
+      logger.warning('slow request %s %s: %.0fms, %d statements in %.0fms, templates %.0fms%s',
+        request.method, request.full_path, total * 1000, stats.statements,
+        stats.db_seconds * 1000, stats.template_seconds * 1000,
+        ''.join('\n  {:.1f}ms {}'.format(seconds * 1000, ' '.join(statement.split()))
+          for seconds, statement in stats.slowest()))
+    return response
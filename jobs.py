@@ -0,0 +1,240 @@
+import logging
+import random
+import signal
+import time
+import traceback
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+import metrics
+from models import db, Job
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Job queue.
+#----------------------------------------------------------------------------#
+
+# Work a write request does not have to wait for (page summary refreshes and
+# the cache invalidation that follows them) is enqueued as a Job row in the
+# request's own transaction, so a job exists exactly when the write
+# committed. Workers ('flask jobs work', as many as needed) claim due jobs
+# with FOR UPDATE SKIP LOCKED and mark them 'running' in a short
+# transaction of their own, then run the handler: its writes and the job's
+# deletion commit together. A worker that dies mid-job rolls back its
+# writes and leaves the job 'running'; once JOBS_LEASE seconds have passed
+# since the claim, another worker takes it again. A failing job is retried
+# with exponential backoff until max_attempts, then kept with status
+# 'failed' for 'flask jobs retry'.
+#
+# An idempotency key coalesces duplicates: enqueueing a key that is already
+# queued does nothing. A running job has given up its key, so a write made
+# while its handler runs (and may already have read the old data) queues
+# the job again. Handlers must be safe to run more than once.
+#
+# With JOBS_EAGER (development, one process, no worker) enqueue() runs the
+# handler inline, inside the caller's transaction.
+
+HANDLERS = {}
+
+PROCESSED = metrics.counter('jobs_processed_total',
+  'Jobs run by this process, by outcome.', labels=('name', 'outcome'))
+DURATION = metrics.histogram('job_duration_seconds',
+  'Time spent running a job.', labels=('name',))
+
+def handler(name):
+  # registers a job handler; the job's args are its keyword arguments
+  def decorator(function):
+    HANDLERS[name] = function
+    return function
+  return decorator
+
+def enqueue(name, key=None, delay=0, **args):
+  # call inside the transaction whose commit makes the job necessary
+  if name not in HANDLERS:
+    raise KeyError('no handler for job ' + name)
+  config = current_app.config
+  if config['JOBS_EAGER']:
+    HANDLERS[name](**args)
+    return
+
+  statement = insert(Job.__table__).values(name=name, args=args, idempotency_key=key,
+    max_attempts=config['JOBS_MAX_ATTEMPTS'], run_at=func.now() + timedelta(seconds=delay))
+  if key is not None:
+    statement = statement.on_conflict_do_nothing(index_elements=['idempotency_key'],
+      index_where=db.text("status = 'queued'"))
+  db.session.execute(statement)
+
+#----------------------------------------------------------------------------#
+# Worker.
+#----------------------------------------------------------------------------#
+
+def _claim(session, names=None, lease=None):
+  # the next due job (or running job past its lease), locked by this
+  # transaction; None when nothing is due or every due job is held by
+  # another worker
+  lease = current_app.config['JOBS_LEASE'] if lease is None else lease
+  query = session.query(Job).filter(or_(
+    and_(Job.status == 'queued', Job.run_at <= func.now()),
+    and_(Job.status == 'running', Job.locked_at <= func.now() - timedelta(seconds=lease))))
+  if names:
+    query = query.filter(Job.name.in_(names))
+  return query.order_by(Job.run_at, Job.id).with_for_update(skip_locked=True).first()
+
+def _backoff(attempts, config):
+  # exponential, capped, with jitter so failed jobs do not retry in step
+  delay = min(config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1), config['JOBS_MAX_RETRY_DELAY'])
+  return delay * random.uniform(0.75, 1.0)
+
+def _start(session, job):
+  # marks a claimed job running and commits, which releases its key;
+  # returns what _execute needs once the row is no longer loaded
+  attempts = job.attempts + 1
+  started = job.id, job.name, job.args, attempts, job.max_attempts
+  job.status, job.attempts, job.locked_at = 'running', attempts, func.now()
+  session.commit()
+  return started
+
+UNIQUE_VIOLATION = '23505'
+
+def _failed(job_id, attempts, max_attempts, error):
+  # record a failed attempt: reschedule, or give up after max_attempts
+  job = db.session.query(Job).filter(Job.id == job_id)
+  values = {
+    Job.last_error: error,
+    Job.run_at: func.now() + timedelta(seconds=_backoff(attempts, current_app.config)),
+  }
+  if attempts >= max_attempts:
+    values[Job.status] = 'failed'
+    job.update(values, synchronize_session=False)
+    db.session.commit()
+    return
+
+  # one statement, so no enqueue can slip in between check and update; an
+  # enqueue committed while it runs still trips the unique key index
+  queued = Job.__table__.alias('queued')
+  covered = exists().where(and_(queued.c.status == 'queued', queued.c.idempotency_key == Job.idempotency_key))
+  values[Job.status] = 'queued'
+  try:
+    rescheduled = job.filter(~covered).update(values, synchronize_session=False)
+  except IntegrityError as violation:
+    if getattr(violation.orig, 'pgcode', None) != UNIQUE_VIOLATION:
+      raise
+    db.session.rollback()
+    rescheduled = 0
+  if not rescheduled:
+    # the key was queued again meanwhile, and that job covers the retry
+    job.delete(synchronize_session=False)
+  db.session.commit()
+
+def run_next(names=None):
+  # runs one due job; returns (name, outcome), or None when nothing is due
+  job = _claim(db.session, names)
+  if job is None:
+    db.session.rollback()
+    return None
+  if job.attempts >= job.max_attempts:
+    # only a job whose worker stopped during its last attempt gets here
+    name = job.name
+    job.status, job.last_error = 'failed', 'worker stopped during the last attempt'
+    db.session.commit()
+    PROCESSED.inc(name, 'failed')
+    return name, 'failed'
+  return _execute(*_start(db.session, job))
+
+def _execute(job_id, name, args, attempts, max_attempts):
+  started = time.perf_counter()
+  try:
+    HANDLERS[name](**args)
+    db.session.query(Job).filter(Job.id == job_id).delete(synchronize_session=False)
+    db.session.commit()
+    outcome = 'done'
+  except Exception:
+    db.session.rollback()
+    outcome = 'retry' if attempts < max_attempts else 'failed'
+    logger.warning('job %s %s attempt %d/%d failed (%s)', job_id, name, attempts, max_attempts, outcome,
+      exc_info=True)
+    _failed(job_id, attempts, max_attempts, traceback.format_exc())
+
+  DURATION.observe(time.perf_counter() - started, name)
+  PROCESSED.inc(name, outcome)
+  return name, outcome
+
+def work(names=None, poll_interval=1.0, burst=False, echo=None):
+  # runs jobs until SIGTERM/SIGINT (finishing the job in hand), or, with
+  # burst, until nothing is due; returns the number of jobs run
+  stopping = []
+  def stop(signum, frame):
+    stopping.append(signum)
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+
+  processed = 0
+  while not stopping:
+    result = run_next(names)
+    if result is not None:
+      processed += 1
+      if echo:
+        echo('{} {}'.format(*result))
+      continue
+    if burst:
+      break
+    time.sleep(poll_interval)
+  db.session.remove()
+  return processed
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+jobs_cli = AppGroup('jobs', help='Run and inspect the background job queue.')
+
+@jobs_cli.command('work')
+@click.option('--name', 'names', multiple=True, help='Only run jobs with this name; repeatable.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+@click.option('--verbose', '-v', is_flag=True, help='Print each job as it finishes.')
+def work_command(names, burst, verbose):
+  """Run due jobs until stopped (run one or more next to the web workers)."""
+  processed = work(names=list(names), poll_interval=current_app.config['JOBS_POLL_INTERVAL'],
+    burst=burst, echo=click.echo if verbose else None)
+  click.echo('{} jobs run'.format(processed))
+
+@jobs_cli.command('stats')
+def stats_command():
+  """Show queued and failed jobs by name."""
+  rows = db.session.query(Job.status, Job.name, func.count(Job.id), func.min(Job.run_at)) \
+    .group_by(Job.status, Job.name) \
+    .order_by(Job.status, Job.name) \
+    .all()
+  for status, name, count, oldest in rows:
+    click.echo('{:<8} {:<32} {:>8}  oldest run_at {}'.format(status, name, count, oldest.isoformat()))
+  if not rows:
+    click.echo('no jobs')
+
+@jobs_cli.command('retry')
+def retry_command():
+  """Queue failed jobs again, with fresh attempts."""
+  job, queued = Job.__table__, Job.__table__.alias('queued')
+  # a failed job whose key is queued again already is covered by that job
+  statement = job.update() \
+    .where(job.c.status == 'failed') \
+    .where(~exists().where(and_(queued.c.status == 'queued', queued.c.idempotency_key == job.c.idempotency_key))) \
+    .values(status='queued', attempts=0, run_at=func.now())
+  requeued = db.session.execute(statement).rowcount
+  db.session.commit()
+  click.echo('{} jobs queued again'.format(requeued))
+
+def init_app(app):
+  app.config.setdefault('JOBS_EAGER', False)
+  app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+  app.config.setdefault('JOBS_RETRY_DELAY', 10)
+  app.config.setdefault('JOBS_MAX_RETRY_DELAY', 3600)
+  app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+  app.config.setdefault('JOBS_LEASE', 600)
+  app.cli.add_command(jobs_cli)
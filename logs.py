@@ -0,0 +1,185 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler,
+  WatchedFileHandler)
+
+from flask import g, has_request_context, request
+
+import instrumentation
+import metrics
+
+#----------------------------------------------------------------------------#
+# Structured logging.
+#----------------------------------------------------------------------------#
+
+# Request threads only put records on a bounded queue; a QueueListener
+# thread formats them as JSON lines and writes them to a file. A
+# slow or full disk can then never add request latency: when the queue is
+# full, records are dropped and counted instead of blocking. INFO and lower
+# can be sampled with LOG_INFO_SAMPLE_RATE, warnings and errors never are.
+#
+# Every worker process has its own listener, so the workers must not rotate
+# a shared file themselves: the default LOG_ROTATE 'external' appends and
+# reopens the file once logrotate (or similar) has moved it. 'size' and
+# 'time' rotate in-process and need a file per worker, e.g. a LOG_FILE of
+# 'fyyur-{pid}.log'.
+
+DROPPED = metrics.counter('log_records_dropped_total',
+  'Log records dropped because the log queue was full.')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+def request_id():
+  # the caller's X-Request-ID, or a new one, fixed for the whole request
+  if 'request_id' not in g:
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+  return g.request_id
+
+class RequestContextFilter(logging.Filter):
+  # copies request fields onto the record in the request thread, while
+  # they are still reachable
+
+  def filter(self, record):
+    if has_request_context():
+      record.request_id = request_id()
+      record.route = request.endpoint
+      record.method = request.method
+      record.path = request.path
+    return True
+
+class SamplingFilter(logging.Filter):
+
+  def __init__(self, rate):
+    logging.Filter.__init__(self)
+    self.rate = rate
+
+  def filter(self, record):
+    return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+class NonBlockingQueueHandler(QueueHandler):
+
+  def prepare(self, record):
+    # resolve the message and traceback here, leave the JSON to the
+    # listener thread
+    record = logging.makeLogRecord(record.__dict__)
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    return record
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except queue.Full:
+      DROPPED.inc()
+
+# record attributes written when present, in this order
+FIELDS = ('request_id', 'route', 'method', 'path', 'status', 'latency_ms', 'db_ms', 'db_statements')
+
+class JSONFormatter(logging.Formatter):
+
+  def format(self, record):
+    entry = {
+      "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+      "level": record.levelname,
+      "logger": record.name,
+      "message": record.msg if record.args is None else record.getMessage(),
+    }
+    for field in FIELDS:
+      value = getattr(record, field, None)
+      if value is not None:
+        entry[field] = value
+    if record.exc_text:
+      entry["exception"] = record.exc_text
+    return json.dumps(entry, default=str)
+
+#----------------------------------------------------------------------------#
+# Setup.
+#----------------------------------------------------------------------------#
+
+def _file_handler(config):
+  filename = config['LOG_FILE'].format(pid=os.getpid())
+  if config['LOG_ROTATE'] == 'time':
+    handler = TimedRotatingFileHandler(filename, when=config['LOG_ROTATE_WHEN'],
+      backupCount=config['LOG_BACKUP_COUNT'], utc=True)
+  elif config['LOG_ROTATE'] == 'size':
+    handler = RotatingFileHandler(filename, maxBytes=config['LOG_MAX_BYTES'],
+      backupCount=config['LOG_BACKUP_COUNT'])
+  else:
+    handler = WatchedFileHandler(filename)
+  handler.setFormatter(JSONFormatter())
+  return handler
+
+access_log = logging.getLogger('fyyur.access')
+
+# (process id, queue handler) of the running listener; apps created after
+# the first in a process share it, a forked child starts its own
+_started = None
+
+def init_app(app):
+  app.config.setdefault('LOG_FILE', 'fyyur.log')
+  app.config.setdefault('LOG_LEVEL', 'INFO')
+  app.config.setdefault('LOG_ROTATE', 'external')
+  app.config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+  app.config.setdefault('LOG_ROTATE_WHEN', 'midnight')
+  app.config.setdefault('LOG_BACKUP_COUNT', 5)
+  app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+  app.config.setdefault('LOG_INFO_SAMPLE_RATE', 1.0)
+  app.config.setdefault('LOG_ACCESS', True)
+
+  @app.before_request
+  def assign_request_id():
+    request_id()
+
+  @app.after_request
+  def log_request(response):
+    response.headers[REQUEST_ID_HEADER] = request_id()
+    if app.config['LOG_ACCESS']:
+      stats = instrumentation.current()
+      extra = {"status": response.status_code}
+      if stats is not None:
+        extra.update({
+          "latency_ms": round(stats.elapsed() * 1000, 1),
+          "db_ms": round(stats.db_seconds * 1000, 1),
+          "db_statements": stats.statements,
+        })
+      access_log.info('%s %s %s', request.method, request.full_path, response.status_code, extra=extra)
+    return response
+
+  if app.debug:
+    # keep Flask's plain stderr logging while developing
+    return
+  app.logger.setLevel(app.config['LOG_LEVEL'])
+  _start(app.config)
+
+def _start(config):
+  # one queue and writer thread per process, however many apps are created
+  global _started
+  root = logging.getLogger()
+  if _started is not None:
+    pid, handler = _started
+    if pid == os.getpid():
+      return
+    # the parent's listener thread did not survive the fork
+    root.removeHandler(handler)
+
+  handler = NonBlockingQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']))
+  handler.addFilter(SamplingFilter(config['LOG_INFO_SAMPLE_RATE']))
+  handler.addFilter(RequestContextFilter())
+
+  root.setLevel(config['LOG_LEVEL'])
+  root.addHandler(handler)
+  _started = os.getpid(), handler
+
+  listener = QueueListener(handler.queue, _file_handler(config), respect_handler_level=True)
+  listener.start()
+  # flush what is queued when the worker exits
+  atexit.register(listener.stop)
@@ -0,0 +1,110 @@
+import threading
+from bisect import bisect_left
+
+from flask import Response
+
+#----------------------------------------------------------------------------#
+# Metric types.
+#----------------------------------------------------------------------------#
+
+# A small in-process registry rendered in the Prometheus text format. Each
+# worker keeps its own numbers, so scrape every worker (or run one per
+# container) rather than expecting totals across the whole server.
+
+def _labels(names, values):
+  if not names:
+    return ''
+  pairs = ('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+    for name, value in zip(names, values))
+  return '{' + ','.join(pairs) + '}'
+
+class Counter(object):
+  kind = 'counter'
+
+  def __init__(self, name, help, labels=()):
+    self.name, self.help, self.label_names = name, help, tuple(labels)
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def inc(self, *labels, amount=1):
+    with self._lock:
+      self._values[labels] = self._values.get(labels, 0) + amount
+
+  def samples(self):
+    with self._lock:
+      return [(self.name + _labels(self.label_names, labels), value)
+        for labels, value in sorted(self._values.items())]
+
+class Gauge(object):
+  # read when scraped, from a function returning a number
+  kind = 'gauge'
+
+  def __init__(self, name, help, read):
+    self.name, self.help, self.read = name, help, read
+
+  def samples(self):
+    return [(self.name, self.read())]
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+class Histogram(object):
+  kind = 'histogram'
+
+  def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+    self.name, self.help, self.label_names = name, help, tuple(labels)
+    self.buckets = tuple(buckets)
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def observe(self, value, *labels):
+    with self._lock:
+      counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+      counts[bisect_left(self.buckets, value)] += 1
+      self._values[labels] = (counts, total + value)
+
+  def samples(self):
+    samples = []
+    with self._lock:
+      for labels, (counts, total) in sorted(self._values.items()):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+          cumulative += count
+          names = self.label_names + ('le',)
+          samples.append((self.name + '_bucket' + _labels(names, labels + (bound,)), cumulative))
+        samples.append((self.name + '_sum' + _labels(self.label_names, labels), total))
+        samples.append((self.name + '_count' + _labels(self.label_names, labels), cumulative))
+    return samples
+
+#----------------------------------------------------------------------------#
+# Registry.
+#----------------------------------------------------------------------------#
+
+_registry = []
+
+def register(metric):
+  _registry.append(metric)
+  return metric
+
+def counter(name, help, labels=()):
+  return register(Counter(name, help, labels))
+
+def gauge(name, help, read):
+  return register(Gauge(name, help, read))
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS):
+  return register(Histogram(name, help, labels, buckets))
+
+def render():
+  lines = []
+  for metric in _registry:
+    lines.append('# HELP {} {}'.format(metric.name, metric.help))
+    lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+    for sample, value in metric.samples():
+      lines.append('{} {}'.format(sample, value))
+  return '\n'.join(lines) + '\n'
+
+def init_app(app):
+
+  @app.route('/metrics')
+  def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
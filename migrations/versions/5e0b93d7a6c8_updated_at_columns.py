@@ -0,0 +1,29 @@
+"""updated_at columns
+
+Revision ID: 5e0b93d7a6c8
+Revises: c27f5e8a9b04
+Create Date: 2026-10-18 15:21:40.093355
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b93d7a6c8'
+down_revision = 'c27f5e8a9b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                                       server_default=sa.text('now()'), nullable=False))
+        op.create_index(op.f('ix_{}_updated_at'.format(table)), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Venue', 'Artist', 'Show'):
+        op.drop_index(op.f('ix_{}_updated_at'.format(table)), table_name=table)
+        op.drop_column(table, 'updated_at')
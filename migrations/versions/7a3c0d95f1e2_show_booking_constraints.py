@@ -0,0 +1,54 @@
+"""show end times and booking exclusion constraints
+
+Revision ID: 7a3c0d95f1e2
+Revises: e81d2b4f6a39
+Create Date: 2026-10-18 18:02:47.380915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3c0d95f1e2'
+down_revision = 'e81d2b4f6a39'
+branch_labels = None
+depends_on = None
+
+
+# shows that start before the latest end of an earlier show for the same key
+OVERLAPS = '''
+SELECT id FROM (
+  SELECT id, start_time, max(end_time) OVER (
+    PARTITION BY {key} ORDER BY start_time, id
+    ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS previous_end
+  FROM "Show"
+) AS ordered
+WHERE previous_end > start_time
+'''
+
+
+def upgrade():
+    # existing shows get the form's default two hour slot
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+    op.execute('''UPDATE "Show" SET end_time = start_time + interval '2 hours' ''')
+    op.alter_column('Show', 'end_time', nullable=False)
+
+    connection = op.get_bind()
+    for key in ('venue_id', 'artist_id'):
+        ids = [row[0] for row in connection.execute(OVERLAPS.format(key=key))]
+        if ids:
+            raise RuntimeError('shows {} overlap an earlier show with the same {}; '
+                               'fix or remove them before upgrading'.format(ids, key))
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT show_venue_no_overlap '
+               'EXCLUDE USING gist (venue_id WITH =, tstzrange(start_time, end_time) WITH &&)')
+    op.execute('ALTER TABLE "Show" ADD CONSTRAINT show_artist_no_overlap '
+               'EXCLUDE USING gist (artist_id WITH =, tstzrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS show_artist_no_overlap')
+    op.execute('ALTER TABLE "Show" DROP CONSTRAINT IF EXISTS show_venue_no_overlap')
+    op.drop_column('Show', 'end_time')
@@ -0,0 +1,59 @@
+"""search vectors and trigram indexes
+
+Revision ID: 9d4a7c61e2b5
+Revises: 3b8e1f0c2a71
+Create Date: 2026-10-18 10:47:31.502914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '9d4a7c61e2b5'
+down_revision = '3b8e1f0c2a71'
+branch_labels = None
+depends_on = None
+
+
+# search_vector covers name, city, state and genres; it is kept current by
+# a trigger because array_to_string() is not immutable and so cannot be used
+# in an expression index
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_vector() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(array_to_string(NEW.genres, ' '), '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(SEARCH_VECTOR_FUNCTION)
+
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(
+            'CREATE TRIGGER "{0}_search_vector" BEFORE INSERT OR UPDATE ON "{0}" '
+            'FOR EACH ROW EXECUTE PROCEDURE fyyur_search_vector()'.format(table))
+        # touch every row so the trigger fills in existing data
+        op.execute('UPDATE "{0}" SET name = name'.format(table))
+        op.create_index('ix_{}_search_vector'.format(table.lower()), table, ['search_vector'],
+                        postgresql_using='gin')
+        op.create_index('ix_{}_name_trgm'.format(table.lower()), table, ['name'],
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_name_trgm'.format(table.lower()), table_name=table)
+        op.drop_index('ix_{}_search_vector'.format(table.lower()), table_name=table)
+        op.execute('DROP TRIGGER IF EXISTS "{0}_search_vector" ON "{0}"'.format(table))
+        op.drop_column(table, 'search_vector')
+
+    op.execute('DROP FUNCTION IF EXISTS fyyur_search_vector()')
@@ -0,0 +1,32 @@
+"""running job status with a lease
+
+Revision ID: a7e42c9d1b63
+Revises: f3c86a1d2e57
+Create Date: 2026-10-18 23:40:51.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e42c9d1b63'
+down_revision = 'f3c86a1d2e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Job', sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_job_running_locked_at', 'Job', ['locked_at'],
+        postgresql_where=sa.text("status = 'running'"))
+
+
+def downgrade():
+    op.drop_index('ix_job_running_locked_at', table_name='Job')
+    # running jobs go back to the queue, unless their key is queued again
+    op.execute('DELETE FROM "Job" running WHERE status = \'running\' AND EXISTS ('
+               'SELECT 1 FROM "Job" queued WHERE queued.status = \'queued\' '
+               'AND queued.idempotency_key = running.idempotency_key)')
+    op.execute('UPDATE "Job" SET status = \'queued\' WHERE status = \'running\'')
+    op.drop_column('Job', 'locked_at')
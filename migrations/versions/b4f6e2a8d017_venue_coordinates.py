@@ -0,0 +1,31 @@
+"""venue coordinates and geohash index
+
+Revision ID: b4f6e2a8d017
+Revises: 7a3c0d95f1e2
+Create Date: 2026-10-18 19:26:05.214478
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4f6e2a8d017'
+down_revision = '7a3c0d95f1e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index('ix_venue_geohash', 'Venue', ['geohash'], unique=False,
+                    postgresql_ops={'geohash': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_venue_geohash', table_name='Venue')
+    op.drop_column('Venue', 'geohash')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
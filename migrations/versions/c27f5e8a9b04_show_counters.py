@@ -0,0 +1,52 @@
+"""denormalized show counters
+
+Revision ID: c27f5e8a9b04
+Revises: 9d4a7c61e2b5
+Create Date: 2026-10-18 13:05:52.770431
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c27f5e8a9b04'
+down_revision = '9d4a7c61e2b5'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL = """
+UPDATE "{table}" SET
+  upcoming_shows_count = counts.upcoming,
+  past_shows_count = counts.past
+FROM (
+  SELECT {fk} AS id,
+    count(*) FILTER (WHERE start_time > now()) AS upcoming,
+    count(*) FILTER (WHERE start_time <= now()) AS past
+  FROM "Show" GROUP BY {fk}
+) AS counts
+WHERE "{table}".id = counts.id
+"""
+
+
+def upgrade():
+    op.create_table('CounterWatermark',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO "CounterWatermark" (id, rolled_at) VALUES (1, now())')
+
+    for table, fk in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute(BACKFILL.format(table=table, fk=fk))
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+
+    op.drop_table('CounterWatermark')
@@ -0,0 +1,37 @@
+"""venue and artist page summaries
+
+Revision ID: d5a19c3e7b60
+Revises: b4f6e2a8d017
+Create Date: 2026-10-18 19:58:31.604127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a19c3e7b60'
+down_revision = 'b4f6e2a8d017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by 'flask summaries refresh'; pages fall back to the base
+    # tables until a row exists
+    for table, owner in (('VenueSummary', 'Venue'), ('ArtistSummary', 'Artist')):
+        op.create_table(table,
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('document', postgresql.JSONB(), nullable=False),
+            sa.Column('past_shows', postgresql.JSONB(), nullable=False),
+            sa.Column('upcoming_shows', postgresql.JSONB(), nullable=False),
+            sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+            sa.ForeignKeyConstraint(['id'], [owner + '.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('ArtistSummary')
+    op.drop_table('VenueSummary')
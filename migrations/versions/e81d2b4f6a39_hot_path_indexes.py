@@ -0,0 +1,36 @@
+"""indexes for the hot query predicates
+
+Revision ID: e81d2b4f6a39
+Revises: 5e0b93d7a6c8
+Create Date: 2026-10-18 16:40:12.661807
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81d2b4f6a39'
+down_revision = '5e0b93d7a6c8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_start_time', 'Show', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_show_artist_id_start_time', 'Show', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_show_start_time_id', 'Show', ['start_time', 'id'], unique=False)
+    op.create_index('ix_venue_city_state_name', 'Venue', ['city', 'state', 'name'], unique=False)
+    op.create_index('ix_artist_city_state_name', 'Artist', ['city', 'state', 'name'], unique=False)
+    op.create_index('ix_venue_genres', 'Venue', ['genres'], unique=False, postgresql_using='gin')
+    op.create_index('ix_artist_genres', 'Artist', ['genres'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artist_genres', table_name='Artist')
+    op.drop_index('ix_venue_genres', table_name='Venue')
+    op.drop_index('ix_artist_city_state_name', table_name='Artist')
+    op.drop_index('ix_venue_city_state_name', table_name='Venue')
+    op.drop_index('ix_show_start_time_id', table_name='Show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='Show')
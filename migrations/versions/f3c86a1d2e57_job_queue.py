@@ -0,0 +1,45 @@
+"""background job queue
+
+Revision ID: f3c86a1d2e57
+Revises: d5a19c3e7b60
+Create Date: 2026-10-18 21:12:09.318544
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c86a1d2e57'
+down_revision = 'd5a19c3e7b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Job',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('args', postgresql.JSONB(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=True),
+        sa.Column('status', sa.String(length=20), server_default='queued', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # partial indexes: failed rows stay out of the worker's scan and never
+    # block a new job with the same key
+    op.create_index('ix_job_queued_run_at', 'Job', ['run_at', 'id'],
+        postgresql_where=sa.text("status = 'queued'"))
+    op.create_index('ux_job_queued_key', 'Job', ['idempotency_key'], unique=True,
+        postgresql_where=sa.text("status = 'queued'"))
+
+
+def downgrade():
+    op.drop_index('ux_job_queued_key', table_name='Job')
+    op.drop_index('ix_job_queued_run_at', table_name='Job')
+    op.drop_table('Job')
@@ -1,8 +1,10 @@
-from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from datetime import datetime
 
-db = SQLAlchemy()
+from replicas import RoutingSQLAlchemy
+
+# a Flask-SQLAlchemy instance whose sessions can read from a replica
+db = RoutingSQLAlchemy()
 
 #----------------------------------------------------------------------------#
 # Models.
@@ -10,6 +12,14 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
   __tablename__ = 'Venue'
+  __table_args__ = (
+    db.Index('ix_venue_search_vector', 'search_vector', postgresql_using='gin'),
+    db.Index('ix_venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_venue_city_state_name', 'city', 'state', 'name'),
+    db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+    # pattern ops so geohash LIKE 'prefix%' is an index range scan
+    db.Index('ix_venue_geohash', 'geohash', postgresql_ops={'geohash': 'varchar_pattern_ops'}),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String)
@@ -27,6 +37,22 @@ class Venue(db.Model):
   seeking_talent = db.Column(db.Boolean(), default=True)
   seeking_description = db.Column(db.String(500))
 
+  # city-level coordinates from the offline geocoder (see geo.py)
+  latitude = db.Column(db.Float)
+  longitude = db.Column(db.Float)
+  geohash = db.Column(db.String(12))
+
+  # maintained by a trigger (see migrations), only loaded when asked for
+  search_vector = db.deferred(db.Column(TSVECTOR))
+
+  # denormalized show counters, relative to CounterWatermark (see counters.py)
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+  # bumped on every write, including counter updates (see conditional.py)
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+    server_default=db.func.now(), onupdate=db.func.now())
+
   shows = db.relationship('Show', backref='Venue', lazy=True)
 
   def __repr__(self):
@@ -35,6 +61,12 @@ class Venue(db.Model):
 
 class Artist(db.Model):
   __tablename__ = 'Artist'
+  __table_args__ = (
+    db.Index('ix_artist_search_vector', 'search_vector', postgresql_using='gin'),
+    db.Index('ix_artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_artist_city_state_name', 'city', 'state', 'name'),
+    db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   name = db.Column(db.String)
@@ -51,6 +83,17 @@ class Artist(db.Model):
   seeking_venue = db.Column(db.Boolean(), default=True)
   seeking_description = db.Column(db.String(120))
 
+  # maintained by a trigger (see migrations), only loaded when asked for
+  search_vector = db.deferred(db.Column(TSVECTOR))
+
+  # denormalized show counters, relative to CounterWatermark (see counters.py)
+  upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+  # bumped on every write, including counter updates (see conditional.py)
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+    server_default=db.func.now(), onupdate=db.func.now())
+
   shows = db.relationship('Show', backref='Artist', lazy=True)
 
   def __repr__(self):
@@ -58,11 +101,75 @@ class Artist(db.Model):
 
 class Show(db.Model):
   __tablename__ = 'Show'
+  __table_args__ = (
+    # detail pages: one venue's/artist's shows in time order
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    # show feed keyset and time-window scans
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    # no double booking; the constraints themselves live in the migration
+    # because they need btree_gist (see booking.py)
+  )
 
   id = db.Column(db.Integer, primary_key=True)
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
   start_time = db.Column(db.DateTime(timezone=True), nullable=False)
+  # stored rather than derived so tstzrange(start_time, end_time) can be indexed
+  end_time = db.Column(db.DateTime(timezone=True), nullable=False)
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True,
+    server_default=db.func.now(), onupdate=db.func.now())
 
-with app.app_context():
-  db.create_all()
+class CounterWatermark(db.Model):
+  __tablename__ = 'CounterWatermark'
+
+  # single row: shows starting after rolled_at are counted as upcoming
+  id = db.Column(db.Integer, primary_key=True)
+  rolled_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+class VenueSummary(db.Model):
+  __tablename__ = 'VenueSummary'
+
+  # the venue page, precomputed (see summaries.py)
+  id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True)
+  document = db.Column(JSONB, nullable=False)
+  past_shows = db.Column(JSONB, nullable=False)
+  upcoming_shows = db.Column(JSONB, nullable=False)
+  refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+class ArtistSummary(db.Model):
+  __tablename__ = 'ArtistSummary'
+
+  # the artist page, precomputed (see summaries.py)
+  id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True)
+  document = db.Column(JSONB, nullable=False)
+  past_shows = db.Column(JSONB, nullable=False)
+  upcoming_shows = db.Column(JSONB, nullable=False)
+  refreshed_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+class Job(db.Model):
+  __tablename__ = 'Job'
+  __table_args__ = (
+    # the worker's scan for due jobs (see jobs.py)
+    db.Index('ix_job_queued_run_at', 'run_at', 'id', postgresql_where=db.text("status = 'queued'")),
+    # at most one queued job per idempotency key; a running job no longer
+    # holds its key
+    db.Index('ux_job_queued_key', 'idempotency_key', unique=True,
+      postgresql_where=db.text("status = 'queued'")),
+    # running jobs whose worker stopped, found by their lease
+    db.Index('ix_job_running_locked_at', 'locked_at', postgresql_where=db.text("status = 'running'")),
+  )
+
+  # deferred work; rows are deleted once they succeed
+  id = db.Column(db.BigInteger, primary_key=True)
+  name = db.Column(db.String(120), nullable=False)
+  args = db.Column(JSONB, nullable=False)
+  idempotency_key = db.Column(db.String(255))
+  # 'queued', 'running' (since locked_at) or 'failed' (out of attempts)
+  status = db.Column(db.String(20), nullable=False, server_default='queued')
+  attempts = db.Column(db.Integer, nullable=False, server_default='0')
+  max_attempts = db.Column(db.Integer, nullable=False)
+  run_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
+  last_error = db.Column(db.Text)
+  locked_at = db.Column(db.DateTime(timezone=True))
+  created_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now())
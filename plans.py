@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy.dialects import postgresql
+
+import queries
+import search
+import summaries
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Hot queries.
+#----------------------------------------------------------------------------#
+
+# The statements the pages run most often, built with the query functions
+# the views and the API call. Each one must be answerable from an index.
+
+def _hot_queries():
+  now = datetime.now()
+  cursor = queries.encode_cursor(now, 1)
+  return [
+    ('venue search', search.search_query(Venue, 'music')),
+    ('artist search', search.search_query(Artist, 'band')),
+    ('venue name search', search.search_query(Venue, 'music', scope='name')),
+    ('venue areas', queries.venue_areas_query()),
+    ('venue areas by genre', queries.venue_areas_query(['Jazz'])),
+    ('show feed, first page', queries.show_feed_query().limit(31)),
+    ('show feed, keyset page', queries.show_feed_query(cursor).limit(31)),
+    ('show feed, time window', queries.show_feed_query(start=now, end=now + timedelta(days=30)).limit(31)),
+    ('venue detail shows', queries.venue_shows_query(1)),
+    ('artist detail shows', queries.artist_shows_query(1)),
+    ('venue page', summaries.page_query('venue', 1)),
+    ('artist page', summaries.page_query('artist', 1)),
+  ]
+
+HOT_TABLES = ('Venue', 'Artist', 'Show', 'VenueSummary', 'ArtistSummary')
+
+def _scans(plan):
+  # walk the EXPLAIN (FORMAT JSON) tree for the scans on hot tables, as
+  # (node type, table)
+  found = []
+  if plan.get('Relation Name') in HOT_TABLES:
+    found.append((plan['Node Type'], plan['Relation Name']))
+  for child in plan.get('Plans', []):
+    found.extend(_scans(child))
+  return found
+
+def _seq_scans(plan):
+  return [table for node, table in _scans(plan) if node == 'Seq Scan']
+
+def explain(query, seqscan=True):
+  compiled = query.statement.compile(dialect=postgresql.dialect())
+  connection = db.session.connection()
+  connection.execute('SET LOCAL enable_seqscan = {}'.format('on' if seqscan else 'off'))
+  result = connection.execute('EXPLAIN (FORMAT JSON) ' + str(compiled), compiled.params).scalar()
+  return result[0]['Plan']
+
+def plan_report():
+  # [(query name, plan as the planner picks it, plan with sequential scans
+  # priced out)]; on a small table the first is often a seq scan, the
+  # second shows whether an index can answer the query at all
+  report = []
+  try:
+    for name, query in _hot_queries():
+      report.append((name, explain(query), explain(query, seqscan=False)))
+  finally:
+    db.session.rollback()
+  return report
+
+def check_plans():
+  # returns [(query name, [tables scanned sequentially])] for queries that
+  # still scan sequentially with enable_seqscan off
+  failures = []
+  for name, default, forced in plan_report():
+    tables = _seq_scans(forced)
+    if tables:
+      failures.append((name, tables))
+  return failures
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+plans_cli = AppGroup('plans', help='Inspect query plans.')
+
+@plans_cli.command('check')
+@click.pass_context
+def check_command(ctx):
+  """Fail if a hot query plans a sequential scan."""
+  failures = check_plans()
+  for name, tables in failures:
+    click.echo('{}: sequential scan on {}'.format(name, ', '.join(tables)), err=True)
+  if failures:
+    ctx.exit(1)
+  click.echo('all hot queries use indexes')
+
+def _describe(plan):
+  return ', '.join('{} on {}'.format(node, table) for node, table in _scans(plan)) or plan['Node Type']
+
+@plans_cli.command('show')
+def show_command():
+  """Print the hot query plans with and without enable_seqscan."""
+  for name, default, forced in plan_report():
+    click.echo(name)
+    click.echo('  {:<20}{}'.format('default:', _describe(default)))
+    click.echo('  {:<20}{}'.format('enable_seqscan off:', _describe(forced)))
@@ -0,0 +1,49 @@
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func
+
+from models import db
+
+#----------------------------------------------------------------------------#
+# Watermark polling.
+#----------------------------------------------------------------------------#
+
+# Per-process state (the suggest index, the LocalBackend cache) cannot hear
+# writes made by other workers or the CLI, so it looks at the table itself:
+# at most once per interval, the newest value of a timestamp column is
+# compared with the watermark left by the previous look, and rows past that
+# watermark less OVERLAP are read again. The overlap covers transactions
+# that took their timestamp before the last look but committed after it.
+
+OVERLAP = timedelta(minutes=1)
+
+class WatermarkPoller(object):
+
+  def __init__(self, overlap=OVERLAP):
+    self.overlap = overlap
+    self._lock = threading.Lock()
+    self._checked_at = None
+    self._marks = {}
+
+  def due(self, interval):
+    # True at most once per interval seconds, for whichever thread asks first
+    now = time.monotonic()
+    with self._lock:
+      if self._checked_at is not None and now - self._checked_at < interval:
+        return False
+      self._checked_at = now
+      return True
+
+  def poll(self, name, column):
+    # (since, moved): the lower bound of the rows to read again, None on the
+    # first look, and whether column has a newer value than last time. An
+    # empty table leaves the database's now() as the watermark, so rows
+    # written before the next look are still past it.
+    latest, now = db.session.query(func.max(column), func.now()).one()
+    mark = self._marks.get(name)
+    self._marks[name] = latest or now
+    if mark is None:
+      return None, False
+    return mark - self.overlap, latest is not None and latest > mark
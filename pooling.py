@@ -0,0 +1,90 @@
+import time
+import weakref
+
+from flask import current_app, has_request_context
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+import metrics
+
+#----------------------------------------------------------------------------#
+# Instrumented pool.
+#----------------------------------------------------------------------------#
+
+CHECKOUT_WAIT = metrics.histogram('db_pool_checkout_wait_seconds',
+  'Time spent waiting for a pooled connection (including opening a new one).')
+CHECKOUT_TIMEOUTS = metrics.counter('db_pool_checkout_timeouts_total',
+  'Checkouts that gave up after DB_POOL_TIMEOUT seconds.')
+
+_pools = weakref.WeakSet()
+
+class InstrumentedQueuePool(QueuePool):
+  # QueuePool that times every checkout; with all connections in use a
+  # request waits here, which is invisible in query timings
+
+  def __init__(self, *args, **kwargs):
+    QueuePool.__init__(self, *args, **kwargs)
+    _pools.add(self)
+
+  def _do_get(self):
+    started = time.perf_counter()
+    try:
+      return QueuePool._do_get(self)
+    except exc.TimeoutError:
+      CHECKOUT_TIMEOUTS.inc()
+      raise
+    finally:
+      CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+metrics.gauge('db_pool_checked_out', 'Connections currently checked out.',
+  lambda: sum(pool.checkedout() for pool in list(_pools)))
+metrics.gauge('db_pool_overflow', 'Connections open beyond DB_POOL_SIZE.',
+  lambda: sum(max(pool.overflow(), 0) for pool in list(_pools)))
+
+#----------------------------------------------------------------------------#
+# Engine options.
+#----------------------------------------------------------------------------#
+
+def engine_options(config):
+  if config['DB_PGBOUNCER']:
+    # PgBouncer does the pooling: hold no connections between requests.
+    # psycopg2 never uses server-side prepared statements, so transaction
+    # pooling is safe as long as session state is only set with SET LOCAL.
+    return {"poolclass": NullPool}
+  return {
+    "poolclass": InstrumentedQueuePool,
+    "pool_size": config['DB_POOL_SIZE'],
+    "max_overflow": config['DB_MAX_OVERFLOW'],
+    "pool_timeout": config['DB_POOL_TIMEOUT'],
+    "pool_recycle": config['DB_POOL_RECYCLE'],
+    "pool_pre_ping": config['DB_POOL_PRE_PING'],
+  }
+
+#----------------------------------------------------------------------------#
+# Statement timeout.
+#----------------------------------------------------------------------------#
+
+# Applied per transaction with SET LOCAL, which works through PgBouncer and
+# only limits web requests: CLI maintenance commands run without a limit.
+# One listener serves every engine and reads the limit of the current app.
+
+@event.listens_for(Engine, 'begin')
+def _limit_statements(connection):
+  if not has_request_context() or connection.dialect.name != 'postgresql':
+    return
+  timeout = current_app.config.get('DB_STATEMENT_TIMEOUT_MS')
+  if timeout:
+    connection.execute('SET LOCAL statement_timeout = {:d}'.format(int(timeout)))
+
+def init_app(app):
+  app.config.setdefault('DB_POOL_SIZE', 5)
+  app.config.setdefault('DB_MAX_OVERFLOW', 10)
+  app.config.setdefault('DB_POOL_TIMEOUT', 30)
+  app.config.setdefault('DB_POOL_RECYCLE', 1800)
+  app.config.setdefault('DB_POOL_PRE_PING', True)
+  app.config.setdefault('DB_STATEMENT_TIMEOUT_MS', 0)
+  app.config.setdefault('DB_PGBOUNCER', False)
+  options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+  options.update(engine_options(app.config))
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
@@ -0,0 +1,293 @@
+import base64
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import desc, func, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from models import db, Artist, Venue, Show
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def genre_filter(model, genres, match='all'):
+  # genres @> ARRAY[...] (has all) or genres && ARRAY[...] (has any); both
+  # are served by the GIN index on the genres column
+  if match == 'any':
+    return model.genres.overlap(genres)
+  return model.genres.contains(genres)
+
+# The read paths are split into a query builder and a function shaping its
+# rows, so the async read mode (asgi.py) runs the very same statements.
+
+def genre_facets_query(model, genres=None, match='all'):
+  # per-genre counts over the (optionally filtered) rows in one grouped query
+  unnested = db.session.query(func.unnest(model.genres).label('genre'))
+  if genres:
+    unnested = unnested.filter(genre_filter(model, genres, match))
+  unnested = unnested.subquery()
+
+  return db.session.query(unnested.c.genre, func.count().label('count')) \
+    .group_by(unnested.c.genre) \
+    .order_by(desc('count'), unnested.c.genre)
+
+def facets_from_rows(rows):
+  return [{"genre": row.genre, "count": row.count} for row in rows]
+
+def genre_facets(model, genres=None, match='all'):
+  return facets_from_rows(genre_facets_query(model, genres, match).all())
+
+def venue_areas_query(genres=None, match='all'):
+  # upcoming show counts are read from the maintained counter column,
+  # so the listing never touches the Show table
+  query = db.session.query(
+      Venue.city,
+      Venue.state,
+      Venue.id,
+      Venue.name,
+      Venue.upcoming_shows_count.label('num_upcoming_shows'))
+  if genres:
+    query = query.filter(genre_filter(Venue, genres, match))
+  return query.order_by(Venue.city, Venue.state, Venue.name)
+
+def venue_areas(genres=None, match='all'):
+  return areas_from_rows(venue_areas_query(genres, match).all())
+
+def areas_from_rows(rows):
+  # rows come back sorted by area, so grouping is a single pass
+  areas = []
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{
+        "id": venue.id,
+        "name": venue.name,
+        "num_upcoming_shows": venue.num_upcoming_shows
+      } for venue in venues]
+    })
+
+  return areas
+
+def encode_cursor(start_time, show_id):
+  # opaque keyset cursor for the (start_time, id) ordering of the show feed
+  raw = '{}|{}'.format(start_time.isoformat(), show_id)
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+  import dateutil.parser
+
+  try:
+    start_time, show_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return dateutil.parser.isoparse(start_time), int(show_id)
+  except (ValueError, TypeError):
+    return None
+
+def show_feed_query(cursor=None, start=None, end=None, city=None):
+  # one joined statement for the show tiles, paged on (start_time, id) so
+  # every page is an index range scan no matter how deep the reader goes;
+  # start/end bound that same range scan
+  query = db.session.query(
+      Show.id,
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id)
+
+  if start is not None:
+    query = query.filter(Show.start_time >= start)
+  if end is not None:
+    query = query.filter(Show.start_time < end)
+  if city:
+    query = query.filter(Venue.city == city)
+
+  position = decode_cursor(cursor) if cursor else None
+  if position:
+    query = query.filter(tuple_(Show.start_time, Show.id) < tuple_(*position))
+
+  return query.order_by(desc(Show.start_time), desc(Show.id))
+
+def show_feed(cursor=None, limit=30, start=None, end=None, city=None):
+  # fetch one extra row to find out whether there is a next page
+  rows = show_feed_query(cursor, start=start, end=end, city=city).limit(limit + 1).all()
+  return feed_from_rows(rows, limit)
+
+def feed_from_rows(rows, limit):
+  # (shows, next_cursor) from up to limit + 1 feed rows
+  page = rows[:limit]
+
+  next_cursor = None
+  if len(rows) > limit:
+    last = page[-1]
+    next_cursor = encode_cursor(last.start_time, last.id)
+
+  shows = [{
+    "venue_id": row.venue_id,
+    "venue_name": row.venue_name,
+    "artist_id": row.artist_id,
+    "artist_name": row.artist_name,
+    "artist_image_link": row.artist_image_link,
+    "start_time": row.start_time
+  } for row in page]
+
+  return shows, next_cursor
+
+def _split_shows(rows, now, shape):
+  past_shows, upcoming_shows = [], []
+  for row in rows:
+    start_time = row.start_time
+    if start_time.tzinfo is not None:
+      start_time = start_time.astimezone().replace(tzinfo=None)
+    (upcoming_shows if start_time > now else past_shows).append(shape(row))
+  return past_shows, upcoming_shows
+
+def venue_shows_query(venue_id):
+  return db.session.query(
+      Show.start_time,
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.image_link.label('artist_image_link')) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Show.venue_id == venue_id) \
+    .order_by(Show.start_time)
+
+def artist_shows_query(artist_id):
+  return db.session.query(
+      Show.start_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Venue.image_link.label('venue_image_link')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .filter(Show.artist_id == artist_id) \
+    .order_by(Show.start_time)
+
+def venue_detail(venue_id, now=None):
+  # the venue row plus one joined statement for all of its shows
+  venue = db.session.query(Venue).get(venue_id)
+  if venue is None:
+    return None
+
+  rows = venue_shows_query(venue_id).all()
+
+  past_shows, upcoming_shows = _split_shows(rows, now or datetime.now(), lambda row: {
+    "artist_id": row.artist_id,
+    "artist_name": row.artist_name,
+    "artist_image_link": row.artist_image_link,
+    "start_time": row.start_time
+  })
+
+  return {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": venue.genres or [],
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "past_shows": past_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows": upcoming_shows,
+    "upcoming_shows_count": len(upcoming_shows)
+  }
+
+def artist_detail(artist_id, now=None):
+  # the artist row plus one joined statement for all of its shows
+  artist = db.session.query(Artist).get(artist_id)
+  if artist is None:
+    return None
+
+  rows = artist_shows_query(artist_id).all()
+
+  past_shows, upcoming_shows = _split_shows(rows, now or datetime.now(), lambda row: {
+    "venue_id": row.venue_id,
+    "venue_name": row.venue_name,
+    "venue_image_link": row.venue_image_link,
+    "start_time": row.start_time
+  })
+
+  return {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": artist.genres or [],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "past_shows": past_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows": upcoming_shows,
+    "upcoming_shows_count": len(upcoming_shows)
+  }
+
+def artist_list_query(genres=None, match='all'):
+  query = db.session.query(Artist.id, Artist.name)
+  if genres:
+    query = query.filter(genre_filter(Artist, genres, match))
+  return query.order_by(Artist.name)
+
+def artists_from_rows(rows):
+  return [{
+    "id": artist.id,
+    "name": artist.name
+  } for artist in rows]
+
+def artist_list(genres=None, match='all'):
+  return artists_from_rows(artist_list_query(genres, match))
+
+def entity_page(model, columns, after_id=None, limit=100):
+  # flat keyset page over the primary key for the JSON API; only the
+  # requested columns are selected and rows are streamed from the cursor
+  query = db.session.query(model.id, *[getattr(model, column) for column in columns if column != 'id'])
+  if after_id is not None:
+    query = query.filter(model.id > after_id)
+  return query.order_by(model.id).limit(limit + 1).yield_per(500)
+
+CALENDAR_BUCKETS = ('day', 'week', 'month')
+
+def show_calendar(bucket, start, end, venue_id=None, artist_id=None, city=None):
+  # shows in [start, end) grouped into day/week/month buckets by date_trunc,
+  # each bucket carrying its shows as a JSON array: one statement over the
+  # (venue_id|artist_id, start_time) or start_time index
+  period = func.date_trunc(bucket, Show.start_time).label('period')
+  show = func.json_build_object(
+    'id', Show.id,
+    'start_time', Show.start_time,
+    'venue_id', Show.venue_id,
+    'venue_name', Venue.name,
+    'artist_id', Show.artist_id,
+    'artist_name', Artist.name)
+
+  query = db.session.query(
+      period,
+      func.count(Show.id).label('count'),
+      func.json_agg(aggregate_order_by(show, Show.start_time)).label('shows')) \
+    .join(Venue, Venue.id == Show.venue_id) \
+    .join(Artist, Artist.id == Show.artist_id) \
+    .filter(Show.start_time >= start, Show.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+  if city:
+    query = query.filter(Venue.city == city)
+
+  rows = query.group_by(period).order_by(period).all()
+  return [{
+    "period": row.period,
+    "count": row.count,
+    "shows": row.shows
+  } for row in rows]
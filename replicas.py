@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm
+
+logger = logging.getLogger(__name__)
+
+#----------------------------------------------------------------------------#
+# Session routing.
+#----------------------------------------------------------------------------#
+
+# With SQLALCHEMY_REPLICA_URI set, GET and HEAD requests (and the search
+# forms' POSTs) read from the replica bind and every other request, CLI command and flush goes to the
+# primary. A client that has just written keeps reading from the primary
+# for REPLICA_READ_YOUR_WRITES_SECONDS so it sees its own change, and all
+# clients fall back to the primary while the replica lags by more than
+# REPLICA_MAX_LAG_SECONDS or cannot be reached.
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# POSTed only to carry a search term; they read like GETs and write nothing
+READ_ONLY_ENDPOINTS = ('pages.search_venues', 'pages.search_artists')
+
+class RoutingSession(SignallingSession):
+
+  def get_bind(self, mapper=None, clause=None):
+    if not self._flushing and has_request_context() and g.get('db_role') == REPLICA:
+      return self.db.get_engine(self.app, bind=REPLICA)
+    return SignallingSession.get_bind(self, mapper, clause)
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+#----------------------------------------------------------------------------#
+# Replica health.
+#----------------------------------------------------------------------------#
+
+# seconds behind the primary; 0 when every received WAL record has been
+# replayed (an idle primary leaves the replay timestamp behind), NULL when
+# the server is not a standby at all
+LAG_QUERY = '''
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+'''
+
+class HealthCheck(object):
+  # replica lag, measured at most once per interval per process
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._checked_at = None
+    self._healthy = False
+    self.lag = None
+
+  def _measure(self, engine):
+    if engine.dialect.name != 'postgresql':
+      # e.g. two SQLite files in development: nothing to measure
+      return 0.0
+    with engine.connect() as connection:
+      lag = connection.execute(LAG_QUERY).scalar()
+    return float(lag or 0)
+
+  def healthy(self, engine, max_lag, interval):
+    with self._lock:
+      now = time.monotonic()
+      if self._checked_at is not None and now - self._checked_at < interval:
+        return self._healthy
+      self._checked_at = now
+      try:
+        self.lag = self._measure(engine)
+        self._healthy = self.lag <= max_lag
+        if not self._healthy:
+          logger.warning('replica is %.1fs behind, reading from the primary', self.lag)
+      except Exception:
+        logger.exception('replica health check failed, reading from the primary')
+        self.lag, self._healthy = None, False
+      return self._healthy
+
+health = HealthCheck()
+
+#----------------------------------------------------------------------------#
+# Request hooks.
+#----------------------------------------------------------------------------#
+
+WROTE_AT = '_wrote_at'
+
+def _reads_only():
+  return request.method in SAFE_METHODS or request.endpoint in READ_ONLY_ENDPOINTS
+
+def _choose_role(app, db):
+  # 'primary' or the replica bind for the current request
+  if not _reads_only():
+    return 'primary'
+  wrote_at = session.get(WROTE_AT)
+  if wrote_at and time.time() - wrote_at < app.config['REPLICA_READ_YOUR_WRITES_SECONDS']:
+    return 'primary'
+  engine = db.get_engine(app, bind=REPLICA)
+  if not health.healthy(engine, app.config['REPLICA_MAX_LAG_SECONDS'], app.config['REPLICA_CHECK_INTERVAL']):
+    return 'primary'
+  return REPLICA
+
+def init_app(app):
+  # models.py builds db from RoutingSQLAlchemy, so it is imported late
+  from models import db
+
+  app.config.setdefault('SQLALCHEMY_REPLICA_URI', None)
+  app.config.setdefault('REPLICA_READ_YOUR_WRITES_SECONDS', 5)
+  app.config.setdefault('REPLICA_MAX_LAG_SECONDS', 10)
+  app.config.setdefault('REPLICA_CHECK_INTERVAL', 5)
+  if not app.config['SQLALCHEMY_REPLICA_URI']:
+    return
+  binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+  binds[REPLICA] = app.config['SQLALCHEMY_REPLICA_URI']
+  app.config['SQLALCHEMY_BINDS'] = binds
+
+  @app.before_request
+  def route_session():
+    g.db_role = _choose_role(app, db)
+
+  @app.after_request
+  def remember_write(response):
+    if not _reads_only() and response.status_code < 400:
+      session[WROTE_AT] = time.time()
+    return response
@@ -0,0 +1,59 @@
+import re
+
+from sqlalchemy import desc, func, or_
+
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+def _like_pattern(term):
+  # escape LIKE wildcards so the user's text is matched literally
+  escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+  return '%{}%'.format(escaped)
+
+def _prefix_tsquery(term):
+  # 'blue no' -> 'blue:* & no:*' so partially typed words still match
+  words = re.findall(r'\w+', term.lower())
+  if not words:
+    return None
+  return func.to_tsquery('simple', ' & '.join(word + ':*' for word in words))
+
+def search_query(model, term, scope='all', limit=50):
+  # name substring match is served by the pg_trgm index, the optional
+  # city/state/genre match by the search_vector GIN index; upcoming show
+  # counts are the maintained counter column
+  match = model.name.ilike(_like_pattern(term))
+  rank = func.similarity(model.name, term)
+
+  tsquery = _prefix_tsquery(term)
+  if scope == 'all' and tsquery is not None:
+    match = or_(match, model.search_vector.op('@@')(tsquery))
+    rank = rank + func.ts_rank(model.search_vector, tsquery)
+
+  return db.session.query(
+      model.id,
+      model.name,
+      model.upcoming_shows_count.label('num_upcoming_shows')) \
+    .filter(match) \
+    .order_by(desc(rank), model.name) \
+    .limit(limit)
+
+def results_from_rows(rows):
+  data = [{
+    "id": row.id,
+    "name": row.name,
+    "num_upcoming_shows": row.num_upcoming_shows
+  } for row in rows]
+
+  return {
+    "count": len(data),
+    "data": data
+  }
+
+def search_venues(term, scope='all', limit=50):
+  return results_from_rows(search_query(Venue, term, scope, limit).all())
+
+def search_artists(term, scope='all', limit=50):
+  return results_from_rows(search_query(Artist, term, scope, limit).all())
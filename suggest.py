@@ -0,0 +1,122 @@
+import threading
+from bisect import bisect_left, insort
+
+from sqlalchemy import func
+
+import polling
+from models import db, Artist, Venue
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+class PrefixIndex(object):
+  # names kept in one sorted list of (key, kind, id, name) tuples; a prefix
+  # lookup is a bisect to the first candidate followed by a short scan
+
+  def __init__(self):
+    self._entries = []
+    self._keys = {}
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def _normalize(text):
+    return ' '.join((text or '').lower().split())
+
+  def build(self, items):
+    entries = []
+    keys = {}
+    for kind, id, name in items:
+      entry = (self._normalize(name), kind, id, name)
+      entries.append(entry)
+      keys[(kind, id)] = entry
+    entries.sort()
+    with self._lock:
+      self._entries = entries
+      self._keys = keys
+
+  def add(self, kind, id, name):
+    with self._lock:
+      self._discard(kind, id)
+      entry = (self._normalize(name), kind, id, name)
+      insort(self._entries, entry)
+      self._keys[(kind, id)] = entry
+
+  def remove(self, kind, id):
+    with self._lock:
+      self._discard(kind, id)
+
+  def _discard(self, kind, id):
+    entry = self._keys.pop((kind, id), None)
+    if entry is not None:
+      position = bisect_left(self._entries, entry)
+      if position < len(self._entries) and self._entries[position] == entry:
+        del self._entries[position]
+
+  def complete(self, prefix, limit=10, kind=None):
+    prefix = self._normalize(prefix)
+    if not prefix:
+      return []
+    results = []
+    with self._lock:
+      position = bisect_left(self._entries, (prefix,))
+      while position < len(self._entries) and len(results) < limit:
+        key, entry_kind, id, name = self._entries[position]
+        if not key.startswith(prefix):
+          break
+        if kind is None or entry_kind == kind:
+          results.append({"type": entry_kind, "id": id, "name": name})
+        position += 1
+    return results
+
+  def count(self, kind):
+    with self._lock:
+      return sum(1 for entry_kind, _ in self._keys if entry_kind == kind)
+
+  def __len__(self):
+    return len(self._entries)
+
+# one index per worker process; create/edit/delete handlers keep it current
+# for their own worker, sync() for everyone else's writes
+index = PrefixIndex()
+
+KINDS = (('venue', Venue), ('artist', Artist))
+
+def build_index():
+  venues = db.session.query(Venue.id, Venue.name).all()
+  artists = db.session.query(Artist.id, Artist.name).all()
+  index.build(
+    [('venue', venue.id, venue.name) for venue in venues] +
+    [('artist', artist.id, artist.name) for artist in artists])
+
+#----------------------------------------------------------------------------#
+# Cross-process sync.
+#----------------------------------------------------------------------------#
+
+# Writes served by other workers, imports run from the CLI and deletes
+# never reach this process's index directly. At most once per
+# SUGGEST_SYNC_INTERVAL, sync_index() re-adds every name updated since the
+# last look (see polling.py; re-adding is harmless), then rebuilds the
+# whole index if its size no longer matches the table, which only a delete
+# elsewhere causes.
+
+index_poller = polling.WatermarkPoller()
+
+def sync_index(interval):
+  if not index_poller.due(interval):
+    return
+  for kind, model in KINDS:
+    since, _ = index_poller.poll(kind, model.updated_at)
+    if since is not None:
+      for row in db.session.query(model.id, model.name).filter(model.updated_at > since):
+        index.add(kind, row.id, row.name)
+    if index.count(kind) != db.session.query(func.count(model.id)).scalar():
+      build_index()
+
+def init_app(app):
+  app.config.setdefault('SUGGEST_SYNC_INTERVAL', 5)
+
+  @app.before_first_request
+  def load_suggest_index():
+    build_index()
+    sync_index(0)
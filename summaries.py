@@ -0,0 +1,227 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
+
+import caching
+import jobs
+import queries
+from models import db, Artist, Venue, Show, ArtistSummary, VenueSummary
+
+#----------------------------------------------------------------------------#
+# Summary read models.
+#----------------------------------------------------------------------------#
+
+# VenueSummary and ArtistSummary hold each detail page ready to render: the
+# entity's fields plus its past and upcoming shows, split at refresh time.
+# Show, venue and artist writes enqueue a refresh of the affected rows in
+# their own transaction and a job worker runs it (see jobs.py); 'flask
+# summaries refresh' (run from cron next to the counter roll-forward)
+# rebuilds everything. A page is then one primary-key lookup.
+
+VENUE_FIELDS = ('id', 'name', 'genres', 'address', 'city', 'state', 'phone', 'website',
+  'facebook_link', 'seeking_talent', 'seeking_description', 'image_link')
+ARTIST_FIELDS = ('id', 'name', 'genres', 'city', 'state', 'phone', 'website',
+  'facebook_link', 'seeking_venue', 'seeking_description', 'image_link')
+
+# summary model, owner model, its fields, the show foreign key, and the
+# model and prefix of the other side shown in each show entry
+READ_MODELS = {
+  'venue': (VenueSummary, Venue, VENUE_FIELDS, Show.venue_id, Artist, 'artist', Show.artist_id),
+  'artist': (ArtistSummary, Artist, ARTIST_FIELDS, Show.artist_id, Venue, 'venue', Show.venue_id),
+}
+
+EMPTY = literal_column("'[]'::jsonb")
+
+def _shows(owner_fk, other, prefix, other_fk, ids):
+  # both show lists for every owner in ids, in one grouped pass over Show
+  show = func.jsonb_build_object(
+    prefix + '_id', other_fk,
+    prefix + '_name', other.name,
+    prefix + '_image_link', other.image_link,
+    # jsonb keeps a timestamptz as ISO 8601 with its offset
+    'start_time', Show.start_time)
+  shows = func.jsonb_agg(aggregate_order_by(show, Show.start_time))
+  query = select([
+      owner_fk.label('owner_id'),
+      shows.filter(Show.start_time <= func.now()).label('past_shows'),
+      shows.filter(Show.start_time > func.now()).label('upcoming_shows')]) \
+    .select_from(Show.__table__.join(other.__table__, other.id == other_fk)) \
+    .group_by(owner_fk)
+  if ids is not None:
+    query = query.where(owner_fk.in_(ids))
+  return query.alias('shows')
+
+def refresh(kind, ids=None):
+  # upsert the summaries for ids (a list or a select of ids; None for all)
+  # with one INSERT ... SELECT ... ON CONFLICT statement
+  summary, model, fields, owner_fk, other, prefix, other_fk = READ_MODELS[kind]
+  db.session.flush()
+  shows = _shows(owner_fk, other, prefix, other_fk, ids)
+  document = func.jsonb_build_object(*[
+    part for field in fields for part in (field, getattr(model, field))])
+
+  query = select([
+      model.id,
+      document,
+      func.coalesce(shows.c.past_shows, EMPTY),
+      func.coalesce(shows.c.upcoming_shows, EMPTY),
+      func.now()]) \
+    .select_from(model.__table__.outerjoin(shows, shows.c.owner_id == model.id))
+  if ids is not None:
+    query = query.where(model.id.in_(ids))
+
+  table = summary.__table__
+  columns = [table.c.id, table.c.document, table.c.past_shows, table.c.upcoming_shows, table.c.refreshed_at]
+  statement = insert(table).from_select(columns, query)
+  statement = statement.on_conflict_do_update(
+    index_elements=[table.c.id],
+    set_={column.name: statement.excluded[column.name] for column in columns[1:]})
+  return db.session.execute(statement).rowcount
+
+def venue_changed(venue_id):
+  # the venue's own page and every artist page listing one of its shows
+  refresh('venue', [venue_id])
+  refresh('artist', select([Show.artist_id]).where(Show.venue_id == venue_id))
+
+def artist_changed(artist_id):
+  refresh('artist', [artist_id])
+  refresh('venue', select([Show.venue_id]).where(Show.artist_id == artist_id))
+
+def shows_changed(venue_ids, artist_ids):
+  if venue_ids:
+    refresh('venue', list(venue_ids))
+  if artist_ids:
+    refresh('artist', list(artist_ids))
+
+#----------------------------------------------------------------------------#
+# Deferred refresh.
+#----------------------------------------------------------------------------#
+
+# Call these inside the transaction of the write. The jobs drop the cached
+# pages again once the summaries are fresh: a page cached between the
+# commit and the refresh would otherwise live out its TTL.
+
+@jobs.handler('summaries.venue')
+def _venue_job(venue_id):
+  venue_changed(venue_id)
+  caching.venue_changed(venue_id)
+
+@jobs.handler('summaries.artist')
+def _artist_job(artist_id):
+  artist_changed(artist_id)
+  caching.artist_changed(artist_id)
+
+@jobs.handler('summaries.pages')
+def _pages_job(venue_ids, artist_ids):
+  shows_changed(venue_ids, artist_ids)
+  caching.cache.delete('venues', *([caching.venue_key(id) for id in venue_ids] +
+    [caching.artist_key(id) for id in artist_ids]))
+  caching.cache.bump('shows')
+
+def defer_venue(venue_id):
+  # a venue was created or edited
+  jobs.enqueue('summaries.venue', key='summaries.venue:{}'.format(venue_id), venue_id=venue_id)
+
+def defer_artist(artist_id):
+  jobs.enqueue('summaries.artist', key='summaries.artist:{}'.format(artist_id), artist_id=artist_id)
+
+def defer_pages(venue_ids=(), artist_ids=()):
+  # shows were written for these venues and artists, or they were imported
+  venue_ids, artist_ids = sorted(set(venue_ids)), sorted(set(artist_ids))
+  key = None
+  if len(venue_ids) + len(artist_ids) <= 2:
+    # single-show writes coalesce; import batches are unique anyway
+    key = 'summaries.pages:{}:{}'.format(','.join(map(str, venue_ids)), ','.join(map(str, artist_ids)))
+  jobs.enqueue('summaries.pages', key=key, venue_ids=venue_ids, artist_ids=artist_ids)
+
+#----------------------------------------------------------------------------#
+# Pages.
+#----------------------------------------------------------------------------#
+
+def page_query(kind, id):
+  table = READ_MODELS[kind][0].__table__
+  return db.session.query(
+      table.c.document,
+      table.c.past_shows,
+      table.c.upcoming_shows,
+      func.now().label('now')) \
+    .filter(table.c.id == id)
+
+def _start_time(show, tzinfo):
+  # the stored ISO string as an aware datetime; summaries refreshed before
+  # offsets were stored hold the database session's local time
+  import dateutil.parser
+
+  start_time = dateutil.parser.isoparse(show['start_time'])
+  if start_time.tzinfo is None:
+    start_time = start_time.replace(tzinfo=tzinfo)
+  return dict(show, start_time=start_time)
+
+def page_from_row(row):
+  past_shows = [_start_time(show, row.now.tzinfo) for show in row.past_shows]
+  upcoming_shows = [_start_time(show, row.now.tzinfo) for show in row.upcoming_shows]
+  # shows that have started since the refresh move over; both lists are
+  # in time order, so they come off the front of upcoming_shows
+  started = 0
+  while started < len(upcoming_shows) and upcoming_shows[started]['start_time'] <= row.now:
+    started += 1
+  past_shows.extend(upcoming_shows[:started])
+  upcoming_shows = upcoming_shows[started:]
+
+  page = dict(row.document)
+  page['genres'] = page['genres'] or []
+  page.update({
+    "past_shows": past_shows,
+    "past_shows_count": len(past_shows),
+    "upcoming_shows": upcoming_shows,
+    "upcoming_shows_count": len(upcoming_shows)
+  })
+  return page
+
+def _page(kind, id, fallback):
+  row = page_query(kind, id).one_or_none()
+  if row is None:
+    # not refreshed yet (or gone): build it from the base tables
+    return fallback(id)
+  return page_from_row(row)
+
+def venue_page(venue_id):
+  return _page('venue', venue_id, queries.venue_detail)
+
+def artist_page(artist_id):
+  return _page('artist', artist_id, queries.artist_detail)
+
+#----------------------------------------------------------------------------#
+# Bulk refresh.
+#----------------------------------------------------------------------------#
+
+def refresh_all(kind, batch_size=1000):
+  # rebuild every summary of one kind; one id range per transaction keeps
+  # row locks short
+  model = READ_MODELS[kind][1]
+  refreshed, after_id = 0, 0
+  while True:
+    ids = [id for id, in db.session.query(model.id)
+      .filter(model.id > after_id).order_by(model.id).limit(batch_size)]
+    if not ids:
+      return refreshed
+    refreshed += refresh(kind, ids)
+    db.session.commit()
+    after_id = ids[-1]
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+summaries_cli = AppGroup('summaries', help='Maintain the venue and artist page summaries.')
+
+@summaries_cli.command('refresh')
+@click.option('--batch-size', default=1000, show_default=True)
+def refresh_command(batch_size):
+  """Rebuild every summary (run from cron with the counter roll-forward)."""
+  for kind in sorted(READ_MODELS):
+    click.echo('{} {} summaries refreshed'.format(refresh_all(kind, batch_size), kind))
+
+def init_app(app):
+  app.cli.add_command(summaries_cli)
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from flask import g
+
+#----------------------------------------------------------------------------#
+# Fixtures.
+#----------------------------------------------------------------------------#
+
+# The tests run against a real Postgres (array operators, exclusion
+# constraints, SKIP LOCKED): point TEST_DATABASE_URL at a scratch database.
+# It is migrated to head once per session and its tables are emptied after
+# every test. Without it the tests are skipped.
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+TABLES = ('Job', 'VenueSummary', 'ArtistSummary', 'Show', 'Venue', 'Artist', 'CounterWatermark')
+
+@pytest.fixture(scope='session')
+def app():
+  if not TEST_DATABASE_URL:
+    pytest.skip('set TEST_DATABASE_URL to a scratch Postgres database')
+  os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+  from flask_migrate import upgrade
+  from app import create_app
+
+  app = create_app()
+  app.config['TESTING'] = True
+  with app.app_context():
+    upgrade(directory=MIGRATIONS)
+  return app
+
+@pytest.fixture
+def database(app):
+  from models import db
+
+  with app.app_context():
+    yield db
+    db.session.rollback()
+    db.session.execute('TRUNCATE {} RESTART IDENTITY CASCADE'.format(', '.join('"{}"'.format(table) for table in TABLES)))
+    db.session.commit()
+    db.session.remove()
+
+@pytest.fixture
+def count_statements(app):
+  # statements a call runs inside a request, from the instrumentation hooks
+  import instrumentation
+  from models import db
+
+  def count(function, *args, **kwargs):
+    db.session.rollback()
+    with app.test_request_context():
+      g.request_stats = instrumentation.RequestStats()
+      function(*args, **kwargs)
+      return g.request_stats.statements
+  return count
@@ -0,0 +1,62 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import caching
+import summaries
+from models import Artist, Show, Venue
+
+START = datetime(2030, 1, 1, 20, 0, tzinfo=timezone.utc)
+
+class JSONBackend(caching.LocalBackend):
+  # stores values the way RedisBackend does, without a redis server
+
+  def get(self, key):
+    raw = caching.LocalBackend.get(self, key)
+    return None if raw is None else json.loads(raw)
+
+  def set(self, key, value, ttl):
+    caching.LocalBackend.set(self, key, json.dumps(value, default=caching._isoformat), ttl)
+
+def _redis():
+  url = os.environ.get('TEST_REDIS_URL')
+  if not url:
+    pytest.skip('set TEST_REDIS_URL to a scratch redis database')
+  backend = caching.RedisBackend(url, prefix='fyyur-test:')
+  backend.client.flushdb()
+  return backend
+
+BACKENDS = {
+  'local': caching.LocalBackend,
+  'json': JSONBackend,
+  'redis': _redis,
+}
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+  saved = caching.cache.backend
+  caching.cache.backend = BACKENDS[request.param]()
+  yield caching.cache.backend
+  caching.cache.backend = saved
+
+@pytest.fixture
+def venue_id(database):
+  venue = Venue(name='The Hall', city='Oakland', state='CA', address='1 Main Street', genres=['Jazz'])
+  artist = Artist(name='The Band', city='Oakland', state='CA', genres=['Jazz'])
+  database.session.add_all([venue, artist])
+  database.session.flush()
+  database.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=START,
+    end_time=START + timedelta(hours=2)))
+  database.session.flush()
+  summaries.refresh('venue')
+  database.session.commit()
+  return venue.id
+
+def test_detail_times_are_iso_8601_utc_from_every_backend(app, backend, venue_id):
+  client = app.test_client()
+  # the first request fills the cache, the second reads from it
+  for _ in range(2):
+    shows = client.get('/api/v1/venues/{}'.format(venue_id)).get_json()['upcoming_shows']
+    assert [show['start_time'] for show in shows] == ['2030-01-01T20:00:00+00:00']
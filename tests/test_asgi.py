@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+asyncpg = pytest.importorskip('asyncpg')
+pytest.importorskip('starlette')
+
+import queries
+import search
+import summaries
+from models import Artist, Show, Venue
+
+# The async read views run the WSGI views' queries through compile_query on
+# asyncpg: each query here has to give the same rows both ways.
+
+def _fetch(app, query):
+  import asgi
+
+  sql, params = asgi.compile_query(query)
+  uri = asgi.database_uri(dict(app.config, ASYNC_DATABASE_URI=None))
+
+  async def fetch():
+    connection = await asyncpg.connect(uri)
+    try:
+      await asgi._init_connection(connection)
+      return [asgi._row(record) for record in await connection.fetch(sql, *params)]
+    finally:
+      await connection.close()
+
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(fetch())
+  finally:
+    loop.close()
+
+@pytest.fixture
+def listed(database):
+  venues = [Venue(name='Venue {}'.format(number), city='Oakland', state='CA', address='1 Main Street',
+    genres=['Jazz', 'Blues'] if number % 2 else ['Rock']) for number in range(4)]
+  artist = Artist(name='The Venue Band', city='Oakland', state='CA', genres=['Jazz'])
+  database.session.add_all(venues + [artist])
+  database.session.flush()
+  start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+  database.session.add_all([Show(venue_id=venues[1].id, artist_id=artist.id, start_time=start + timedelta(days=day),
+    end_time=start + timedelta(days=day, hours=2)) for day in range(3)])
+  database.session.flush()
+  summaries.refresh('venue')
+  database.session.commit()
+  return venues[1].id
+
+def test_array_parameters_match(app, listed):
+  query = queries.venue_areas_query(['Jazz', 'Blues'], 'all')
+  assert queries.areas_from_rows(_fetch(app, query)) == queries.areas_from_rows(query.all())
+
+def test_search_parameters_match(app, listed):
+  query = search.search_query(Venue, 'venue 1', 'all', 10)
+  assert search.results_from_rows(_fetch(app, query)) == search.results_from_rows(query.all())
+
+def test_datetime_parameters_match(app, listed):
+  start = datetime.now(timezone.utc)
+  query = queries.show_feed_query(start=start, end=start + timedelta(days=7)).limit(2)
+  assert queries.feed_from_rows(_fetch(app, query), 1) == queries.feed_from_rows(query.all(), 1)
+
+def test_summary_page_matches(app, listed):
+  query = summaries.page_query('venue', listed)
+  page = summaries.page_from_row(_fetch(app, query)[0])
+  assert page == summaries.page_from_row(query.one())
+  assert page['upcoming_shows_count'] == 3
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import booking
+from models import Artist, Show, Venue
+
+def _at(hour):
+  return datetime(2030, 1, 1, hour, tzinfo=timezone.utc)
+
+#----------------------------------------------------------------------------#
+# Interval index.
+#----------------------------------------------------------------------------#
+
+@pytest.fixture
+def index():
+  index = booking.IntervalIndex()
+  index.load(1, [(_at(14), _at(16)), (_at(10), _at(12))])
+  return index
+
+def test_empty_index_has_no_conflicts():
+  index = booking.IntervalIndex()
+  assert 1 not in index
+  assert index.conflict(1, _at(10), _at(12)) is None
+  index.load(1, [])
+  assert 1 in index
+  assert index.conflict(1, _at(10), _at(12)) is None
+
+def test_touching_intervals_do_not_conflict(index):
+  assert index.conflict(1, _at(8), _at(10)) is None
+  assert index.conflict(1, _at(12), _at(14)) is None
+  assert index.conflict(1, _at(16), _at(18)) is None
+
+def test_overlapping_neighbours_conflict(index):
+  assert index.conflict(1, _at(11), _at(13)) == (_at(10), _at(12))
+  assert index.conflict(1, _at(13), _at(15)) == (_at(14), _at(16))
+
+def test_containment_conflicts_both_ways(index):
+  # inside a booking, and around one
+  assert index.conflict(1, _at(10) + timedelta(minutes=30), _at(11)) == (_at(10), _at(12))
+  assert index.conflict(1, _at(9), _at(13)) == (_at(10), _at(12))
+  assert index.conflict(1, _at(13), _at(17)) == (_at(14), _at(16))
+
+def test_keys_are_independent(index):
+  assert index.conflict(2, _at(10), _at(12)) is None
+
+def test_added_intervals_are_kept_in_order(index):
+  index.add(1, _at(12), _at(14))
+  assert index.conflict(1, _at(13), _at(13) + timedelta(minutes=1)) == (_at(12), _at(14))
+  assert index.conflict(1, _at(16), _at(17)) is None
+
+#----------------------------------------------------------------------------#
+# Against the database.
+#----------------------------------------------------------------------------#
+
+@pytest.fixture
+def booked(database):
+  # the venue and the artist hold two hours; stored naive like form input
+  # and read back as the database sees it
+  venue = Venue(name='The Hall', city='Oakland', state='CA', address='1 Main Street', genres=['Jazz'])
+  artist = Artist(name='The Band', city='Oakland', state='CA', genres=['Jazz'])
+  database.session.add_all([venue, artist])
+  database.session.flush()
+  start = datetime(2030, 1, 1, 20, 0)
+  database.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=start,
+    end_time=start + timedelta(hours=2)))
+  database.session.commit()
+  return venue.id, artist.id, database.session.query(Show.start_time).scalar()
+
+def test_find_conflicts_treats_the_end_as_open(booked):
+  venue_id, artist_id, start = booked
+  assert booking.find_conflicts(venue_id, None, start + timedelta(hours=2), start + timedelta(hours=3)) == []
+  assert len(booking.find_conflicts(None, artist_id, start + timedelta(hours=1), start + timedelta(hours=3))) == 1
+
+def test_batch_validator_checks_the_database_and_the_batch(booked):
+  venue_id, artist_id, start = booked
+  validator = booking.BatchValidator()
+  assert validator.check(venue_id, 99, start + timedelta(hours=1), start + timedelta(hours=3)) == \
+    'venue {} is already booked at that time'.format(venue_id)
+  assert validator.check(98, 99, start, start + timedelta(hours=2)) is None
+  assert validator.check(97, 99, start + timedelta(hours=1), start + timedelta(hours=2)) == \
+    'artist 99 is already booked at that time'
+
+def _post_show(app, venue_id, artist_id, start_time, duration='120'):
+  return app.test_client().post('/shows/create', data={"venue_id": str(venue_id), "artist_id": str(artist_id),
+    "start_time": start_time, "duration_minutes": duration})
+
+def test_constraint_conflict_rerenders_the_form(app, database, booked, monkeypatch):
+  venue_id, artist_id, start = booked
+  # another request booked the slot after the form's own check
+  monkeypatch.setattr(booking, 'find_conflicts', lambda *args, **kwargs: [])
+
+  # the same wall-clock time, read by the database in the same time zone
+  response = _post_show(app, venue_id, artist_id, start.strftime('%Y-%m-%d %H:%M'))
+  assert response.status_code == 200
+  assert 'already booked at that time' in response.get_data(as_text=True)
+  assert database.session.query(Show).count() == 1
+
+def test_invalid_duration_rerenders_the_form(app, database, booked):
+  venue_id, artist_id, start = booked
+  response = _post_show(app, venue_id, artist_id, '2031-01-01 20:00', duration='0')
+  assert response.status_code == 200
+  assert 'please correct the fields marked below' in response.get_data(as_text=True)
+  assert database.session.query(Show).count() == 1
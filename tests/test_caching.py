@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import caching
+from models import Artist, Show, Venue
+
+@pytest.fixture
+def cache(monkeypatch):
+  cache = caching.Cache()
+  monkeypatch.setattr(caching, 'cache', cache)
+  return cache
+
+def test_get_or_set_builds_once(cache):
+  built = []
+  def build():
+    built.append(1)
+    return {"name": "The Hall"}
+
+  assert cache.get_or_set('venue:1', build) == {"name": "The Hall"}
+  assert cache.get_or_set('venue:1', build) == {"name": "The Hall"}
+  assert len(built) == 1
+  assert cache.stats() == {"hits": 1, "misses": 1}
+
+def test_missing_values_are_not_cached(cache):
+  assert cache.get_or_set('venue:1', lambda: None) is None
+  assert cache.get_or_set('venue:1', lambda: {"name": "The Hall"}) == {"name": "The Hall"}
+
+def test_local_backend_expires_and_evicts(monkeypatch):
+  clock = [100.0]
+  monkeypatch.setattr(caching.time, 'monotonic', lambda: clock[0])
+  backend = caching.LocalBackend(max_entries=2)
+  backend.set('a', 1, ttl=10)
+  backend.set('b', 2, ttl=10)
+  backend.get('a')
+  backend.set('c', 3, ttl=10)
+  # 'b' was the least recently used
+  assert (backend.get('a'), backend.get('b'), backend.get('c')) == (1, None, 3)
+
+  clock[0] += 11
+  assert backend.get('a') is None
+
+def test_bump_drops_a_whole_namespace(cache):
+  first = caching.shows_key('abc')
+  cache.get_or_set(first, lambda: ['show'])
+  cache.bump('shows')
+
+  assert caching.shows_key('abc') != first
+  assert cache.backend.get(caching.shows_key('abc')) is None
+  assert caching.shows_key(None) != caching.shows_key('abc')
+
+def test_counters_survive_eviction():
+  backend = caching.LocalBackend(max_entries=1)
+  backend.incr('ns:shows')
+  backend.set('a', 1, ttl=10)
+  backend.set('b', 2, ttl=10)
+  assert backend.counter('ns:shows') == 1
+
+@pytest.fixture
+def booked(database):
+  # venue 1 hosts artists 1 and 2, artist 3 plays elsewhere
+  venues = [Venue(name='Venue {}'.format(number), city='Oakland', state='CA', address='1 Main Street',
+    genres=['Jazz']) for number in (1, 2)]
+  artists = [Artist(name='Artist {}'.format(number), city='Oakland', state='CA', genres=['Jazz'])
+    for number in (1, 2, 3)]
+  database.session.add_all(venues + artists)
+  database.session.flush()
+  start = datetime(2030, 1, 1, 20, 0, tzinfo=timezone.utc)
+  for hours, venue, artist in ((0, venues[0], artists[0]), (3, venues[0], artists[1]), (0, venues[1], artists[2])):
+    database.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=start + timedelta(hours=hours),
+      end_time=start + timedelta(hours=hours + 2)))
+  database.session.commit()
+
+def _fill(cache):
+  keys = ['venues', 'artists'] + [caching.venue_key(id) for id in (1, 2)] + \
+    [caching.artist_key(id) for id in (1, 2, 3)]
+  for key in keys:
+    cache.get_or_set(key, lambda: {"cached": True})
+  return keys
+
+def _cached(cache, keys):
+  return [key for key in keys if cache.backend.get(key) is not None]
+
+def test_venue_changed_drops_its_artists_pages(cache, booked):
+  keys = _fill(cache)
+  shows = caching.shows_key(None)
+  caching.venue_changed(1)
+
+  assert _cached(cache, keys) == ['artists', 'venue:2', 'artist:3']
+  assert caching.shows_key(None) != shows
+
+def test_artist_changed_drops_its_venues_pages(cache, booked):
+  keys = _fill(cache)
+  caching.artist_changed(3)
+
+  assert _cached(cache, keys) == ['venues', 'venue:1', 'artist:1', 'artist:2']
+
+def test_show_changed_drops_both_pages(cache, booked):
+  keys = _fill(cache)
+  caching.show_changed(1, 2)
+
+  assert _cached(cache, keys) == ['artists', 'venue:2', 'artist:1', 'artist:3']
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import counters
+from models import Artist, Show, Venue
+
+NOW = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def owners(database):
+  venue = Venue(name='The Hall', city='Oakland', state='CA', address='1 Main Street', genres=['Jazz'])
+  artist = Artist(name='The Band', city='Oakland', state='CA', genres=['Jazz'])
+  database.session.add_all([venue, artist])
+  database.session.flush()
+  counters._watermark().rolled_at = NOW
+  database.session.commit()
+  return venue, artist
+
+def _show(database, venue, artist, hours):
+  show = Show(venue_id=venue.id, artist_id=artist.id, start_time=NOW + timedelta(hours=hours),
+    end_time=NOW + timedelta(hours=hours + 1))
+  database.session.add(show)
+  counters.show_created(show)
+  database.session.commit()
+  return show
+
+def _counts(database, model, id):
+  return database.session.query(model.upcoming_shows_count, model.past_shows_count) \
+    .filter(model.id == id).one()
+
+def test_shows_are_counted_against_the_watermark(database, owners):
+  venue, artist = owners
+  _show(database, venue, artist, -5)
+  _show(database, venue, artist, 5)
+  _show(database, venue, artist, 10)
+
+  assert _counts(database, Venue, venue.id) == (2, 1)
+  assert _counts(database, Artist, artist.id) == (2, 1)
+
+def test_roll_forward_moves_started_shows(database, owners):
+  venue, artist = owners
+  _show(database, venue, artist, 5)
+  _show(database, venue, artist, 10)
+
+  assert counters.roll_forward(NOW + timedelta(hours=6)) == 1
+  assert _counts(database, Venue, venue.id) == (1, 1)
+  # the watermark never moves back
+  assert counters.roll_forward(NOW) == 0
+  assert _counts(database, Artist, artist.id) == (1, 1)
+
+def test_show_deleted_undoes_show_created(database, owners):
+  venue, artist = owners
+  show = _show(database, venue, artist, 5)
+  counters.show_deleted(show)
+  database.session.delete(show)
+  database.session.commit()
+
+  assert _counts(database, Venue, venue.id) == (0, 0)
+
+def _drift(database, venue):
+  # a counter write that went missing
+  database.session.query(Venue).filter(Venue.id == venue.id) \
+    .update({Venue.upcoming_shows_count: 7}, synchronize_session=False)
+  database.session.commit()
+
+def test_reconcile_reports_and_fixes_drift(database, owners):
+  venue, artist = owners
+  _show(database, venue, artist, 5)
+  _drift(database, venue)
+
+  assert counters.reconcile() == [('Venue', venue.id, (7, 0), (1, 0))]
+  assert _counts(database, Venue, venue.id) == (1, 0)
+  assert counters.reconcile() == []
+
+def test_reconcile_dry_run_changes_nothing(app, database, owners):
+  venue, artist = owners
+  _show(database, venue, artist, 5)
+  _drift(database, venue)
+
+  assert counters.reconcile(fix=False) == [('Venue', venue.id, (7, 0), (1, 0))]
+  assert _counts(database, Venue, venue.id) == (7, 0)
+
+  result = app.test_cli_runner().invoke(args=['counters', 'reconcile', '--dry-run'])
+  assert result.exit_code == 0
+  assert 'Venue {}: stored upcoming/past 7/0, actual 1/0'.format(venue.id) in result.output
+  assert '1 rows drifted\n' in result.output
+  assert _counts(database, Venue, venue.id) == (7, 0)
+
+def test_deleting_a_show_through_the_view(app, database, owners):
+  venue, artist = owners
+  show = _show(database, venue, artist, 5)
+  client = app.test_client()
+
+  response = client.delete('/shows/{}'.format(show.id))
+  assert (response.status_code, response.get_json()) == (200, {"success": True})
+  assert _counts(database, Venue, venue.id) == (0, 0)
+
+  response = client.delete('/shows/{}'.format(show.id))
+  assert (response.status_code, response.get_json()) == (500, {"success": False})
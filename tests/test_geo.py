@@ -0,0 +1,72 @@
+import math
+
+import pytest
+
+import geo
+
+CITIES = sorted(geo.places().items())
+RADII = (10, 50, 250, 1000)
+
+def _covered(prefixes, latitude, longitude):
+  return any(geo.geohash_encode(latitude, longitude).startswith(prefix) for prefix in prefixes)
+
+def _within(latitude, longitude, miles, points):
+  return {point for point in points if geo.distance_miles(latitude, longitude, *point) <= miles}
+
+def test_geohash_matches_the_reference_encoding():
+  assert geo.geohash_encode(57.64911, 10.40744) == 'u4pruydqq'
+  assert geo.geohash_encode(42.6, -5.6, precision=5) == 'ezs42'
+  assert geo.geohash_encode(-90.0, -180.0, precision=3) == '000'
+
+def test_distance_miles():
+  assert geo.distance_miles(40.7128, -74.0060, 40.7128, -74.0060) == 0
+  assert geo.distance_miles(0, 0, 90, 0) == pytest.approx(math.pi / 2 * geo.EARTH_RADIUS_MILES)
+  # across the antimeridian the short way round
+  assert geo.distance_miles(0, 179.5, 0, -179.5) == pytest.approx(geo.distance_miles(0, 0, 0, 1))
+
+@pytest.mark.parametrize('miles', RADII)
+def test_prefix_cover_holds_every_city_in_range(miles):
+  points = [point for _, point in CITIES]
+  for (city, state), (latitude, longitude) in CITIES:
+    prefixes = geo._prefixes(latitude, longitude, miles)
+    missed = [point for point in _within(latitude, longitude, miles, points)
+      if not _covered(prefixes, *point)]
+    assert not missed, (city, state, miles)
+
+@pytest.mark.parametrize('miles', RADII)
+def test_kdtree_matches_brute_force(miles):
+  tree = geo.KDTree([(latitude, longitude, key) for key, (latitude, longitude) in CITIES])
+  for _, (latitude, longitude) in CITIES:
+    expected = {key for key, point in CITIES if geo.distance_miles(latitude, longitude, *point) <= miles}
+    found = {key for lat, lng, key in tree.within(latitude, longitude, miles)
+      if geo.distance_miles(latitude, longitude, lat, lng) <= miles}
+    assert found == expected
+
+def _ring(latitude, longitude, miles, steps=36):
+  # points on the circle of the given radius, and a few inside it
+  points = []
+  for step in range(steps):
+    bearing = 2 * math.pi * step / steps
+    for fraction in (0.5, 0.999):
+      distance = miles * fraction / geo.EARTH_RADIUS_MILES
+      lat1, lng1 = math.radians(latitude), math.radians(longitude)
+      lat2 = math.asin(math.sin(lat1) * math.cos(distance) +
+        math.cos(lat1) * math.sin(distance) * math.cos(bearing))
+      lng2 = lng1 + math.atan2(math.sin(bearing) * math.sin(distance) * math.cos(lat1),
+        math.cos(distance) - math.sin(lat1) * math.sin(lat2))
+      points.append((math.degrees(lat2), (math.degrees(lng2) + 540) % 360 - 180))
+  return points
+
+@pytest.mark.parametrize('latitude, longitude, miles', [
+  (0.0, 179.99, 20),      # antimeridian
+  (51.0, -179.999, 100),
+  (-40.0, 180.0, 250),
+  (89.9, 0.0, 20),        # around the north pole
+  (88.0, 120.0, 200),
+  (-89.5, -45.0, 50),     # south pole
+  (80.0, 10.0, 300),      # wide in longitude near a pole
+])
+def test_prefix_cover_at_the_edges(latitude, longitude, miles):
+  prefixes = geo._prefixes(latitude, longitude, miles)
+  missed = [point for point in _ring(latitude, longitude, miles) if not _covered(prefixes, *point)]
+  assert not missed
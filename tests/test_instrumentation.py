@@ -0,0 +1,32 @@
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+
+import instrumentation
+
+@pytest.fixture
+def connection():
+  connection = create_engine('sqlite://').connect()
+  yield connection
+  connection.close()
+
+def test_statements_are_counted_and_timed(connection):
+  with Flask(__name__).test_request_context():
+    g.request_stats = instrumentation.RequestStats()
+    connection.execute('SELECT 1')
+    connection.execute('SELECT 2')
+    assert g.request_stats.statements == 2
+  assert connection.info['query_started'] == []
+
+def test_a_failed_statement_leaves_no_start_time(connection):
+  with Flask(__name__).test_request_context():
+    g.request_stats = instrumentation.RequestStats()
+    for _ in range(3):
+      with pytest.raises(OperationalError):
+        connection.execute('SELECT * FROM missing')
+    assert g.request_stats.statements == 3
+  assert connection.info['query_started'] == []
+
+  connection.execute('SELECT 1')
+  assert connection.info['query_started'] == []
@@ -0,0 +1,126 @@
+import pytest
+from sqlalchemy import func
+
+import jobs
+from models import Job
+
+NAME = 'tests.flaky'
+KEY = 'tests.flaky:1'
+
+class Calls(list):
+  # values the test handler ran with; exceptions put in failures are
+  # raised by the next calls
+  def __init__(self):
+    list.__init__(self)
+    self.failures = []
+
+@pytest.fixture
+def queue(app, database):
+  # queued rather than eager, with room for a planned failure
+  saved = app.config['JOBS_EAGER'], app.config['JOBS_MAX_ATTEMPTS']
+  app.config['JOBS_EAGER'], app.config['JOBS_MAX_ATTEMPTS'] = False, 3
+  yield database
+  app.config['JOBS_EAGER'], app.config['JOBS_MAX_ATTEMPTS'] = saved
+
+@pytest.fixture
+def calls():
+  made = Calls()
+
+  @jobs.handler(NAME)
+  def flaky(value):
+    made.append(value)
+    if made.failures:
+      raise made.failures.pop()
+
+  yield made
+  jobs.HANDLERS.pop(NAME, None)
+
+@pytest.fixture
+def other(queue):
+  # a second worker's session
+  session = queue.create_scoped_session()
+  yield session
+  session.remove()
+
+def _statuses(database):
+  return sorted(status for status, in database.session.query(Job.status).filter(Job.idempotency_key == KEY))
+
+def test_queued_key_is_enqueued_once(queue, calls):
+  jobs.enqueue(NAME, key=KEY, value=1)
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+
+  assert _statuses(queue) == ['queued']
+
+def test_second_worker_skips_locked_job(queue, calls, other):
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+
+  assert jobs._claim(queue.session, [NAME]) is not None
+  assert jobs._claim(other, [NAME]) is None
+  other.rollback()
+  queue.session.rollback()
+
+def test_failing_job_waits_for_its_backoff(queue, calls):
+  calls.failures.append(RuntimeError('planned failure'))
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+
+  assert jobs.run_next([NAME]) == (NAME, 'retry')
+  attempts, status, later = queue.session.query(Job.attempts, Job.status, Job.run_at > func.now()).one()
+  assert (attempts, status, later) == (1, 'queued', True)
+  assert jobs.run_next([NAME]) is None
+
+  queue.session.query(Job).update({Job.run_at: func.now()}, synchronize_session=False)
+  queue.session.commit()
+  assert jobs.run_next([NAME]) == (NAME, 'done')
+  assert calls == [1, 1]
+  assert queue.session.query(func.count(Job.id)).scalar() == 0
+
+def test_enqueue_while_running_is_kept(queue, calls):
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+  running = jobs._start(queue.session, jobs._claim(queue.session, [NAME]))
+
+  # a write committed while the handler runs
+  jobs.enqueue(NAME, key=KEY, value=2)
+  queue.session.commit()
+  assert _statuses(queue) == ['queued', 'running']
+
+  assert jobs._execute(*running) == (NAME, 'done')
+  assert jobs.run_next([NAME]) == (NAME, 'done')
+  assert calls == [1, 2]
+
+def test_retry_covered_by_a_queued_job_is_dropped(queue, calls):
+  calls.failures.append(RuntimeError('planned failure'))
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+  running = jobs._start(queue.session, jobs._claim(queue.session, [NAME]))
+  jobs.enqueue(NAME, key=KEY, value=2)
+  queue.session.commit()
+
+  assert jobs._execute(*running) == (NAME, 'retry')
+  assert _statuses(queue) == ['queued']
+  assert queue.session.query(Job.args).one().args == {"value": 2}
+
+def test_running_job_is_taken_again_after_its_lease(queue, calls, other):
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+  jobs._start(queue.session, jobs._claim(queue.session, [NAME]))
+
+  # the worker stopped without finishing
+  assert jobs._claim(other, [NAME]) is None
+  other.rollback()
+  assert jobs._claim(other, [NAME], lease=0) is not None
+  other.rollback()
+
+def test_job_stopped_on_its_last_attempt_fails(app, queue, calls):
+  jobs.enqueue(NAME, key=KEY, value=1)
+  queue.session.commit()
+  queue.session.query(Job).update({Job.attempts: app.config['JOBS_MAX_ATTEMPTS'], Job.status: 'running',
+    Job.locked_at: func.now() - func.make_interval(0, 0, 0, 1)}, synchronize_session=False)
+  queue.session.commit()
+
+  assert jobs.run_next([NAME]) == (NAME, 'failed')
+  assert _statuses(queue) == ['failed']
+  assert calls == []
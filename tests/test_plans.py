@@ -0,0 +1,12 @@
+import plans
+
+def test_hot_queries_can_use_indexes(database):
+  assert plans.check_plans() == []
+
+def test_report_has_both_plans(app, database):
+  report = plans.plan_report()
+  assert [name for name, default, forced in report] == [name for name, query in plans._hot_queries()]
+
+  result = app.test_cli_runner().invoke(args=['plans', 'show'])
+  assert result.exit_code == 0
+  assert result.output.count('enable_seqscan off:') == len(report)
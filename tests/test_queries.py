@@ -0,0 +1,23 @@
+import queries
+from models import Venue
+
+def _venue(number, city):
+  return Venue(name='Venue {}'.format(number), city=city, state='CA', address='1 Main Street', genres=['Jazz'])
+
+def test_venue_areas_statement_count_does_not_grow_with_venues(database, count_statements):
+  database.session.add(_venue(0, 'San Francisco'))
+  database.session.commit()
+  one = count_statements(queries.venue_areas)
+
+  database.session.add_all([_venue(number, 'City {}'.format(number % 5)) for number in range(1, 50)])
+  database.session.commit()
+  many = count_statements(queries.venue_areas)
+
+  assert one == many
+
+def test_venue_areas_groups_by_area(database):
+  database.session.add_all([_venue(1, 'Oakland'), _venue(2, 'Oakland'), _venue(3, 'San Francisco')])
+  database.session.commit()
+
+  areas = queries.venue_areas()
+  assert [(area['city'], len(area['venues'])) for area in areas] == [('Oakland', 2), ('San Francisco', 1)]
@@ -0,0 +1,74 @@
+import pytest
+
+import polling
+import suggest
+from models import Artist, Venue
+
+@pytest.fixture
+def index():
+  index = suggest.PrefixIndex()
+  index.build([('venue', 1, 'The Musical Hop'), ('venue', 2, 'Park Square Live Music & Coffee'),
+    ('artist', 1, 'Guns N Petals'), ('artist', 2, 'The Wild Sax Band')])
+  return index
+
+def _names(results):
+  return [result['name'] for result in results]
+
+def test_complete_matches_name_prefixes_case_and_space_insensitively(index):
+  assert _names(index.complete('the')) == ['The Musical Hop', 'The Wild Sax Band']
+  assert _names(index.complete('  THE   wild ')) == ['The Wild Sax Band']
+  assert index.complete('band') == []
+  assert index.complete('') == []
+
+def test_complete_filters_by_kind_and_limit(index):
+  assert index.complete('the', kind='artist') == [{"type": "artist", "id": 2, "name": "The Wild Sax Band"}]
+  assert len(index.complete('the', limit=1)) == 1
+
+def test_add_replaces_a_renamed_entry(index):
+  index.add('venue', 1, 'Hop Street')
+  assert _names(index.complete('the')) == ['The Wild Sax Band']
+  assert _names(index.complete('hop')) == ['Hop Street']
+  assert index.count('venue') == 2
+
+def test_remove(index):
+  index.remove('artist', 1)
+  index.remove('artist', 99)
+  assert index.complete('guns') == []
+  assert (index.count('artist'), len(index)) == (1, 3)
+
+def test_same_name_for_both_kinds(index):
+  index.add('artist', 3, 'The Musical Hop')
+  assert [(result['type'], result['id']) for result in index.complete('the musical')] == \
+    [('artist', 3), ('venue', 1)]
+
+def test_sync_picks_up_other_processes_writes(database, monkeypatch):
+  monkeypatch.setattr(suggest, 'index', suggest.PrefixIndex())
+  monkeypatch.setattr(suggest, 'index_poller', polling.WatermarkPoller())
+  database.session.add(Artist(name='Early Bird', city='Oakland', state='CA', genres=['Jazz']))
+  database.session.commit()
+  suggest.build_index()
+  suggest.sync_index(0)
+
+  # written by another worker: a new venue and a rename
+  database.session.add(Venue(name='Night Owl', city='Oakland', state='CA', address='1 Main Street', genres=['Jazz']))
+  database.session.query(Artist).update({Artist.name: 'Late Bird'})
+  database.session.commit()
+  suggest.sync_index(0)
+
+  assert _names(suggest.index.complete('night')) == ['Night Owl']
+  assert _names(suggest.index.complete('late')) == ['Late Bird']
+  assert suggest.index.complete('early') == []
+
+def test_sync_rebuilds_after_a_delete_elsewhere(database, monkeypatch):
+  monkeypatch.setattr(suggest, 'index', suggest.PrefixIndex())
+  monkeypatch.setattr(suggest, 'index_poller', polling.WatermarkPoller())
+  database.session.add(Artist(name='Gone Soon', city='Oakland', state='CA', genres=['Jazz']))
+  database.session.commit()
+  suggest.build_index()
+  suggest.sync_index(0)
+
+  database.session.query(Artist).delete()
+  database.session.commit()
+  suggest.sync_index(0)
+
+  assert suggest.index.complete('gone') == []
@@ -0,0 +1,523 @@
+from datetime import datetime, timedelta
+
+from flask import Blueprint, abort, current_app, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy.exc import IntegrityError
+
+import booking
+import caching
+import counters
+import geo
+import queries
+import search
+import suggest
+import summaries
+from caching import cache
+from conditional import conditional, venues_validator, venue_validator, artists_validator, artist_validator, shows_validator
+from forms import ArtistForm, ShowForm, VenueForm
+from models import db, Artist, Venue, Show
+
+pages = Blueprint('pages', __name__)
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+@pages.route('/')
+def index():
+  return render_template('pages/home.html')
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@pages.route('/venues')
+@conditional(venues_validator)
+def venues():
+  # areas -> venues -> upcoming show counts, built from a single aggregated query;
+  # ?genre=Jazz&genre=Blues narrows it (all genres, or any with match=any)
+  genres = request.args.getlist('genre')
+  match = request.args.get('match', 'all')
+  if genres:
+    venue_data = queries.venue_areas(genres=genres, match=match)
+  else:
+    venue_data = cache.get_or_set('venues', queries.venue_areas)
+  facets = queries.genre_facets(Venue, genres=genres, match=match)
+
+  return render_template('pages/venues.html', areas=venue_data, facets=facets, genres=genres)
+
+@pages.route('/venues/search', methods=['POST'])
+def search_venues():
+  # get search term from form
+  search_term = request.form.get('search_term', '')
+  # ranked, index-backed match on name (and city/state/genres unless scope=name)
+  response = search.search_venues(search_term,
+    scope=request.form.get('search_scope', 'all'),
+    limit=current_app.config['SEARCH_RESULTS_LIMIT'])
+
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+@pages.route('/venues/near')
+def venues_near():
+  # ?lat=&lng= or ?city=&state=, plus ?miles= (default 20)
+  miles = min(request.args.get('miles', 20.0, type=float), 500.0)
+  latitude = request.args.get('lat', type=float)
+  longitude = request.args.get('lng', type=float)
+  if latitude is None or longitude is None:
+    point = geo.geocode(request.args.get('city'), request.args.get('state'))
+    if point is None:
+      abort(400)
+    latitude, longitude = point
+    place = '{}, {}'.format(request.args.get('city'), request.args.get('state'))
+  else:
+    place = '{:.4f}, {:.4f}'.format(latitude, longitude)
+
+  venue_data = geo.venues_within(latitude, longitude, miles,
+    limit=current_app.config['SEARCH_RESULTS_LIMIT'], backend=current_app.config['GEO_SEARCH_BACKEND'],
+    check_interval=current_app.config['GEO_TREE_CHECK_INTERVAL'])
+  response = {
+    "count": len(venue_data),
+    "data": venue_data
+  }
+
+  return render_template('pages/search_venues.html', results=response,
+    search_term='within {:g} miles of {}'.format(miles, place))
+
+@pages.route('/search/suggest')
+def search_suggest():
+  # name completions for the search boxes, answered from the in-memory index
+  prefix = request.args.get('q', '')
+  limit = min(request.args.get('limit', 10, type=int), 50)
+  kind = request.args.get('type')
+  suggest.sync_index(current_app.config['SUGGEST_SYNC_INTERVAL'])
+  return jsonify(suggest.index.complete(prefix, limit=limit, kind=kind))
+
+@pages.route('/venues/<int:venue_id>')
+@conditional(venue_validator)
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  venue_data = cache.get_or_set(caching.venue_key(venue_id), lambda: summaries.venue_page(venue_id))
+  if venue_data is None:
+    abort(404)
+
+  return render_template('pages/show_venue.html', venue=venue_data)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@pages.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@pages.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  #getting data from form
+  form = VenueForm(request.form)
+
+  #creating a new venue to add to db
+  venue = Venue()
+
+  venue.name = form.name.data
+  venue.genres = request.form.getlist('genres')
+  venue.address = form.address.data
+  venue.city = form.city.data
+  venue.state = form.state.data
+  venue.phone = form.phone.data
+  venue.website = form.website_link.data
+  venue.facebook_link = form.facebook_link.data
+  venue.seeking_talent = form.seeking_talent.data
+  venue.seeking_description = form.seeking_description.data
+  venue.image_link = form.image_link.data
+  geo.locate(venue)
+
+  try:
+    db.session.add(venue)
+    db.session.flush()
+    summaries.defer_venue(venue.id)
+    db.session.commit()
+    suggest.index.add('venue', venue.id, venue.name)
+    cache.delete('venues')
+    geo.venue_moved()
+
+    # if add successful, flash message
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+
+  except:
+    db.session.rollback()
+    flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
+  finally:
+    db.session.close()
+
+  return render_template('pages/home.html')
+
+@pages.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  try:
+    # delete venue with id that's passed in
+    db.session.query(Venue).filter(Venue.id == venue_id).delete()
+    db.session.commit()
+    suggest.index.remove('venue', int(venue_id))
+    caching.venue_changed(venue_id)
+    geo.venue_moved()
+    flash('Venue ID: ' + venue_id + ' was successfully deleted!')
+
+  except:
+    db.session.rollback()
+    flash('An error occurred. Venue ID: ' + venue_id + ' could not be deleted.')
+
+  finally:
+    db.session.close()
+
+  return None
+
+#  Artists
+#  ----------------------------------------------------------------
+@pages.route('/artists')
+@conditional(artists_validator)
+def artists():
+  genres = request.args.getlist('genre')
+  match = request.args.get('match', 'all')
+  if genres:
+    artist_data = queries.artist_list(genres=genres, match=match)
+  else:
+    artist_data = cache.get_or_set('artists', queries.artist_list)
+  facets = queries.genre_facets(Artist, genres=genres, match=match)
+
+  return render_template('pages/artists.html', artists=artist_data, facets=facets, genres=genres)
+
+@pages.route('/artists/search', methods=['POST'])
+def search_artists():
+  search_term = request.form.get('search_term', '')
+  response = search.search_artists(search_term,
+    scope=request.form.get('search_scope', 'all'),
+    limit=current_app.config['SEARCH_RESULTS_LIMIT'])
+
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+# shows the artist page with the given artist_id
+@pages.route('/artists/<int:artist_id>')
+@conditional(artist_validator)
+def show_artist(artist_id):
+  artist_data = cache.get_or_set(caching.artist_key(artist_id), lambda: summaries.artist_page(artist_id))
+  if artist_data is None:
+    abort(404)
+
+  return render_template('pages/show_artist.html', artist=artist_data)
+
+#  Update
+#  ----------------------------------------------------------------
+@pages.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artist = Artist.query.get(artist_id)
+  
+  # fills out form with artist info
+  form.name.data = artist.name
+  form.genres.data = artist.genres or []
+  form.city.data = artist.city
+  form.state.data = artist.state
+  form.phone.data = artist.phone
+  form.website.data = artist.website
+  form.facebook_link.data = artist.facebook_link
+  form.seeking_venue.data = artist.seeking_venue
+  form.seeking_description.data = artist.seeking_description
+  form.image_link.data = artist.image_link
+
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@pages.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+
+  form = ArtistForm(request.form)
+  artist = db.session.query(Artist).filter(Artist.id == artist_id).one()
+
+ # update fields of artist using form fields
+  try:
+    artist.name = form.name.data
+    artist.genres = request.form.getlist('genres')
+    artist.city = form.city.data
+    artist.state = form.state.data
+    artist.phone = form.phone.data
+    artist.website = form.website_link.data
+    artist.facebook_link = form.facebook_link.data
+    artist.seeking_venue = form.seeking_venue.data
+    artist.seeking_description = form.seeking_description.data
+    artist.image_link = form.image_link.data
+
+    db.session.add(artist)
+    summaries.defer_artist(artist_id)
+    db.session.commit()
+    suggest.index.add('artist', artist.id, artist.name)
+    caching.artist_changed(artist_id)
+
+    flash('Artist ID: ' + str(artist_id) + ' successfully updated.')
+
+  except:
+    db.session.rollback()
+    flash('An error occurred. Artist ID: ' + str(artist_id) + ' could not be updated.')
+
+  finally:
+    db.session.close()
+
+  return redirect(url_for('.show_artist', artist_id=artist_id))
+
+@pages.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venue_info = db.session.query(Venue).filter(Venue.id==venue_id).one()
+
+  venue={
+    "id": venue_info.id,
+    "name": venue_info.name,
+    "genres": venue_info.genres or [],
+    "address": venue_info.address,
+    "city": venue_info.city,
+    "state": venue_info.state,
+    "phone": venue_info.phone,
+    "website": venue_info.website,
+    "facebook_link": venue_info.facebook_link,
+    "seeking_talent": venue_info.seeking_talent,
+    "seeking_description": venue_info.seeking_description,
+    "image_link": venue_info.image_link
+  }
+
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@pages.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+
+  try:
+    venue = Venue.query.get(venue_id)
+
+    venue.name = request.form.get('name')
+    venue.genres = request.form.getlist('genres')
+    venue.address = request.form.get('address')
+    venue.city = request.form.get('city')
+    venue.state = request.form.get('state')
+    venue.phone = request.form.get('phone')
+    venue.facebook_link = request.form.get('facebook_link')
+    venue.image_link = request.form.get('image_link')
+    venue.website = request.form.get('website')
+    venue.seeking_talent = request.form.get('seeking_talent')
+    venue.seeking_description = request.form.get('seeking_description')
+    geo.locate(venue)
+
+    db.session.add(venue)
+    summaries.defer_venue(venue_id)
+    db.session.commit()
+    suggest.index.add('venue', venue.id, venue.name)
+    caching.venue_changed(venue_id)
+    geo.venue_moved()
+
+  except:
+    db.session.rollback()
+    flash('An error occurred. Venue ID: ' + str(venue_id) + ' could not be updated.')
+  finally:
+    db.session.close()
+
+  return redirect(url_for('.show_venue', venue_id=venue_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@pages.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@pages.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  form = ArtistForm(request.form)
+  try:
+    artist = Artist()
+    artist.name = form.name.data
+    artist.genres = request.form.getlist('genres')
+    artist.city = form.city.data
+    artist.state = form.state.data
+    artist.phone = form.phone.data
+    artist.website = form.website_link.data
+    artist.facebook_link = form.facebook_link.data
+    artist.seeking_venue = form.seeking_venue.data
+    artist.seeking_description = form.seeking_description.data
+    artist.image_link = form.image_link.data
+    
+    db.session.add(artist)
+    db.session.flush()
+    summaries.defer_artist(artist.id)
+    db.session.commit()
+    suggest.index.add('artist', artist.id, artist.name)
+    cache.delete('artists')
+
+    flash('Artist: ' + request.form['name'] + ' was successfully created.')
+
+  except:
+    db.session.rollback()
+    flash('Artist: ' + request.form['name'] + ' was not created - ERROR')
+
+  finally:
+    db.session.close()
+
+  return render_template('pages/home.html')
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def _time_window(default_days=None):
+  # ?from=&to= as dates or datetimes; from defaults to now when a default
+  # window length is given
+  import dateutil.parser
+
+  try:
+    start = dateutil.parser.parse(request.args['from']) if request.args.get('from') else None
+    end = dateutil.parser.parse(request.args['to']) if request.args.get('to') else None
+  except (ValueError, OverflowError):
+    abort(400)
+  if default_days is not None:
+    start = start or datetime.now()
+    end = end or start + timedelta(days=default_days)
+  return start, end
+
+@pages.route('/shows')
+@conditional(shows_validator)
+def shows():
+  # one page of shows, newest first, with artist and venue joined in;
+  # ?from=&to=&city= narrow the same indexed range scan
+  cursor = request.args.get('cursor')
+  start, end = _time_window()
+  city = request.args.get('city')
+  filters = {key: request.args[key] for key in ('from', 'to', 'city') if request.args.get(key)}
+
+  build = lambda: queries.show_feed(cursor=cursor, limit=current_app.config['SHOWS_PER_PAGE'],
+    start=start, end=end, city=city)
+  if filters:
+    show_data, next_cursor = build()
+  else:
+    show_data, next_cursor = cache.get_or_set(caching.shows_key(cursor), build)
+
+  return render_template('pages/shows.html', shows=show_data, next_cursor=next_cursor, filters=filters)
+
+def _render_calendar(title, **owner):
+  bucket = request.args.get('bucket', 'month')
+  if bucket not in queries.CALENDAR_BUCKETS:
+    abort(400)
+  start, end = _time_window(default_days=current_app.config['CALENDAR_DEFAULT_DAYS'])
+  periods = queries.show_calendar(bucket, start, end, **owner)
+
+  return render_template('pages/calendar.html', title=title, bucket=bucket, periods=periods,
+    start=start, end=end)
+
+@pages.route('/shows/calendar')
+def shows_calendar():
+  city = request.args.get('city')
+  return _render_calendar('Shows in ' + city if city else 'All shows', city=city)
+
+@pages.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+  venue = db.session.query(Venue.name).filter(Venue.id == venue_id).one_or_none()
+  if venue is None:
+    abort(404)
+  return _render_calendar(venue.name, venue_id=venue_id)
+
+@pages.route('/artists/<int:artist_id>/calendar')
+def artist_calendar(artist_id):
+  artist = db.session.query(Artist.name).filter(Artist.id == artist_id).one_or_none()
+  if artist is None:
+    abort(404)
+  return _render_calendar(artist.name, artist_id=artist_id)
+
+@pages.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@pages.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # the show forms have never carried a CSRF token (the importer validates
+  # the same form the same way)
+  form = ShowForm(request.form, meta={'csrf': False})
+  if not form.validate():
+    flash('Show was not created - please correct the fields marked below')
+    return render_template('forms/new_show.html', form=form)
+  new_show = Show()
+
+  try:
+    new_show.venue_id = int(form.venue_id.data)
+    new_show.artist_id = int(form.artist_id.data)
+    new_show.start_time = form.start_time.data
+    new_show.end_time = booking.end_time_for(form.start_time.data, form.duration_minutes.data)
+  except (TypeError, ValueError):
+    flash('Show was not created - the venue ID, artist ID and start time are required')
+    return render_template('forms/new_show.html', form=form)
+
+  # the exclusion constraints have the final say; asking first lets the form
+  # explain which booking is in the way
+  conflicts = booking.find_conflicts(new_show.venue_id, new_show.artist_id,
+    new_show.start_time, new_show.end_time)
+  if conflicts:
+    flash('Show was not created - the venue or artist is already booked at that time')
+    return render_template('forms/new_show.html', form=form)
+
+  try:
+    db.session.add(new_show)
+    # counters are updated in the same transaction as the insert; the page
+    # summary refresh is a job enqueued in it
+    counters.show_created(new_show)
+    summaries.defer_pages([new_show.venue_id], [new_show.artist_id])
+    db.session.commit()
+    caching.show_changed(new_show.venue_id, new_show.artist_id)
+
+    flash('Show was successfully listed!')
+
+  except IntegrityError as error:
+    db.session.rollback()
+    if not booking.is_booking_conflict(error):
+      raise
+    flash('Show was not created - the venue or artist is already booked at that time')
+    return render_template('forms/new_show.html', form=form)
+
+  except:
+    db.session.rollback()
+    flash('Show was not created - ERROR')
+    abort(500)
+
+  finally:
+    db.session.close()
+
+  return render_template('pages/home.html')
+
+@pages.route('/cache/stats')
+def cache_stats():
+  return jsonify(cache.stats())
+
+@pages.route('/shows/<int:show_id>', methods=['DELETE'])
+def delete_show(show_id):
+  try:
+    show = db.session.query(Show).filter(Show.id == show_id).one()
+    venue_id, artist_id = show.venue_id, show.artist_id
+    counters.show_deleted(show)
+    db.session.delete(show)
+    summaries.defer_pages([venue_id], [artist_id])
+    db.session.commit()
+    caching.show_changed(venue_id, artist_id)
+    flash('Show ID: ' + str(show_id) + ' was successfully deleted!')
+
+  except Exception:
+    db.session.rollback()
+    flash('An error occurred. Show ID: ' + str(show_id) + ' could not be deleted.')
+    return jsonify({"success": False}), 500
+
+  finally:
+    db.session.close()
+
+  return jsonify({"success": True})
+
+@pages.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@pages.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500